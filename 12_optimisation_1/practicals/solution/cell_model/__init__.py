@@ -1,2 +1,35 @@
-from .Simulation import Simulation
-from .SimulationCython import SimulationCython
+import importlib
+import sys
+import types
+
+# the backends are only imported when they are first used, so that importing
+# cell_model is fast and does not need the compiled Cython extension
+_backends = ['Simulation', 'SimulationCython']
+
+__all__ = list(_backends)
+
+
+def __getattr__(name):
+    if name in _backends:
+        module = importlib.import_module('.' + name, __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__,
+                                                                    name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # importing a backend module (e.g. cell_model.Simulation) would otherwise
+        # replace the class of the same name on the package
+        if name in _backends and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
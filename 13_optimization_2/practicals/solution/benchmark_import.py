@@ -0,0 +1,41 @@
+import subprocess
+import sys
+import time
+import numpy as np
+
+
+def time_command(code, repeats):
+    """
+    Returns the wall times of repeats runs of a fresh python interpreter
+    running code
+    """
+    times = np.empty(repeats)
+    for i in range(repeats):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        times[i] = time.perf_counter() - start_time
+    return times
+
+
+if __name__ == "__main__":
+    repeats = 20
+
+    # the time to start python itself is subtracted from the others
+    commands = [
+        ('python', 'pass'),
+        ('import cell_model', 'import cell_model'),
+        ('numpy backend', 'import cell_model; cell_model.Simulation'),
+        ('cpp functions backend', 'import cell_model; cell_model.Simulation_cpp'),
+        ('cpp class backend', 'import cell_model_cpp'),
+        ('all backends', 'import cell_model; cell_model.Simulation; '
+                         'cell_model.Simulation_cpp; cell_model.Simulation_mp'),
+    ]
+
+    baseline = None
+    print('{:>25} {:>12} {:>12}'.format('', 'median (s)', 'import (s)'))
+    for name, code in commands:
+        median = np.median(time_command(code, repeats))
+        if baseline is None:
+            baseline = median
+        print('{:>25} {:>12.4f} {:>12.4f}'.format(name, median,
+                                                  median - baseline))
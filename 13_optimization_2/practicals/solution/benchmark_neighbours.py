@@ -0,0 +1,64 @@
+import argparse
+import time
+import numpy as np
+import cell_model_cpp
+
+modes = cell_model_cpp.InteractionMode
+
+
+def time_mode(x, y, size, mode, steps):
+    """
+    Runs steps time steps from positions x and y with the given
+    cell_model_cpp.InteractionMode, and returns the wall time per step, the
+    statistics and the final positions, of shape (2, n)
+    """
+    max_dt = (0.23 * size)**2 / 4.0
+    sim = cell_model_cpp.Simulation(cell_model_cpp.VectorDouble(x),
+                                    cell_model_cpp.VectorDouble(y),
+                                    size, max_dt, 0)
+    if mode == modes.verlet:
+        sim.set_verlet_skin(0.5 * size)
+    sim.set_interaction_mode(mode)
+    start_time = time.perf_counter()
+    sim.integrate(steps * max_dt)
+    elapsed = (time.perf_counter() - start_time) / steps
+    positions = sim.get_positions()
+    return (elapsed, sim.get_statistics(),
+            np.array([[p.x for p in positions], [p.y for p in positions]]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='cost of the neighbour search of each interaction mode')
+    parser.add_argument('--n', nargs='+', type=int, default=[1000, 3000, 10000])
+    parser.add_argument('--size', type=float, default=0.02)
+    parser.add_argument('--sigma', type=float, default=0.05,
+                        help='standard deviation of the initial positions')
+    parser.add_argument('--uniform', action='store_true',
+                        help='start the cells uniformly over the domain '
+                        'instead of clustered')
+    parser.add_argument('--steps', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print('{:>8} {:>10} {:>14} {:>14} {:>12}'.format(
+        'n', 'mode', 'step time (s)', 'pairs / cell', 'difference'))
+    for n in args.n:
+        if args.uniform:
+            x = rng.uniform(size=n)
+            y = rng.uniform(size=n)
+        else:
+            x = rng.normal(0.5, args.sigma, n)
+            y = rng.normal(0.5, args.sigma, n)
+        _, _, reference = time_mode(x, y, args.size, modes.verlet, args.steps)
+        for mode in (modes.hash, modes.grid, modes.verlet, modes.quadtree):
+            elapsed, statistics, positions = time_mode(x, y, args.size, mode,
+                                                       args.steps)
+            # the hash does not apply the cutoff or find neighbours across the
+            # periodic boundary, so it differs from the others. The difference
+            # uses the nearest periodic image, as a cell may wrap in one run
+            difference = (positions - reference + 0.5) % 1.0 - 0.5
+            difference = np.max(np.abs(difference))
+            print('{:>8d} {:>10} {:>14.5f} {:>14.1f} {:>12.2e}'.format(
+                n, mode.name, elapsed,
+                statistics['pairs_evaluated'] / (args.steps * n), difference))
@@ -0,0 +1,134 @@
+import argparse
+import concurrent.futures
+import json
+import multiprocessing as mp
+import time
+import matplotlib.pyplot as plt
+import numpy as np
+import cell_model_cpp
+from cell_model.ensemble import run_ensemble
+from cell_model.Simulation_mp import Simulation_mp
+
+size = 0.005
+max_dt = (0.23 * size)**2 / 4.0
+
+
+def time_ensemble(workers, problem_size):
+    """
+    Runs an ensemble of problem_size samples of the pybind11 Simulation in a
+    pool of workers processes
+    """
+    start_time = time.perf_counter()
+    run_ensemble(problem_size, workers, n=100, size=0.02, end_time=0.002,
+                 nout=2)
+    return time.perf_counter() - start_time
+
+
+def time_domain_decomposition(workers, problem_size):
+    """
+    Runs a simulation of problem_size cells split between workers processes,
+    not counting the time to start the processes
+    """
+    rng = np.random.default_rng(0)
+    x = rng.uniform(size=problem_size)
+    y = rng.uniform(size=problem_size)
+    with Simulation_mp(x, y, size, max_dt, n_processes=workers, seed=0) as sim:
+        sim.calculate_interactions = True
+        start_time = time.perf_counter()
+        sim.integrate(20 * max_dt)
+        return time.perf_counter() - start_time
+
+
+def time_threads(workers, problem_size):
+    """
+    Runs problem_size independent simulations of the function-based C++ model
+    in a pool of workers threads. cell_model_cpp.integrate releases the GIL, so
+    the threads run in parallel
+    """
+    rng = np.random.default_rng(0)
+    positions = [(rng.uniform(size=200), rng.uniform(size=200))
+                 for i in range(problem_size)]
+
+    def run(i):
+        x, y = positions[i]
+        cell_model_cpp.integrate(x, y, 50 * max_dt, max_dt, size, i, True)
+
+    start_time = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        list(pool.map(run, range(problem_size)))
+    return time.perf_counter() - start_time
+
+
+def measure_scaling(time_function, workers, strong_size, weak_size, repeats):
+    """
+    Times time_function(w, problem_size) for each number of workers w, with a
+    fixed problem_size of strong_size (strong scaling) and with problem_size
+    of weak_size per worker (weak scaling). The best of repeats runs is used
+
+    Parallel efficiency is T(1) / (w T(w)) for strong scaling, and T(1) / T(w)
+    for weak scaling, where 1 is ideal
+    """
+    def best_time(w, problem_size):
+        return min(time_function(w, problem_size) for i in range(repeats))
+
+    strong = np.array([best_time(w, strong_size) for w in workers])
+    weak = np.array([best_time(w, weak_size * w) for w in workers])
+    workers = np.array(workers)
+    return {
+        'workers': workers.tolist(),
+        'strong_size': strong_size,
+        'strong_time': strong.tolist(),
+        'strong_efficiency': (strong[0] * workers[0] / (workers * strong)).tolist(),
+        'weak_size_per_worker': weak_size,
+        'weak_time': weak.tolist(),
+        'weak_efficiency': (weak[0] / weak).tolist(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='strong and weak scaling of the parallel backends')
+    parser.add_argument('--max-workers', type=int, default=mp.cpu_count(),
+                        help='largest number of threads or processes')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('-o', '--output', default='scaling.json')
+    args = parser.parse_args()
+
+    workers = list(range(1, args.max_workers + 1))
+
+    # (function, strong scaling problem size, weak scaling size per worker)
+    benchmarks = {
+        'ensemble processes': (time_ensemble, 8 * args.max_workers, 8),
+        'domain decomposition processes': (time_domain_decomposition,
+                                           20000 * args.max_workers, 20000),
+        'simulation threads': (time_threads, 8 * args.max_workers, 8),
+    }
+
+    results = {}
+    for name, (time_function, strong_size, weak_size) in benchmarks.items():
+        print('running {}'.format(name))
+        results[name] = measure_scaling(time_function, workers, strong_size,
+                                        weak_size, args.repeats)
+
+    print('{:>32} {:>8} {:>12} {:>12} {:>12} {:>12}'.format(
+        'benchmark', 'workers', 'strong (s)', 'strong eff', 'weak (s)',
+        'weak eff'))
+    for name, r in results.items():
+        for i, w in enumerate(r['workers']):
+            print('{:>32} {:>8d} {:>12.4f} {:>12.2f} {:>12.4f} {:>12.2f}'.format(
+                name, w, r['strong_time'][i], r['strong_efficiency'][i],
+                r['weak_time'][i], r['weak_efficiency'][i]))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for kind in ('strong', 'weak'):
+        plt.figure()
+        for name, r in results.items():
+            plt.plot(r['workers'], r[kind + '_efficiency'], 'o-', label=name)
+        plt.axhline(1.0, color='k', ls=':')
+        plt.xlabel('threads or processes')
+        plt.ylabel('parallel efficiency')
+        plt.ylim(0.0, 1.1)
+        plt.legend()
+        plt.savefig('{}_scaling.png'.format(kind))
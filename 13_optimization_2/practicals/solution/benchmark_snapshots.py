@@ -0,0 +1,51 @@
+import argparse
+import time
+import numpy as np
+import cell_model_cpp
+from cell_model.snapshots import SnapshotWriter
+from cell_model.trajectory import TrajectoryWriter
+
+
+def run(n, nout, steps, filename, background):
+    """
+    Runs a simulation of n cells for nout output intervals of steps time steps,
+    writing the positions after each interval to a trajectory file either
+    inline or on a background thread, and returns the wall time
+    """
+    size = 0.5 / np.sqrt(n)
+    max_dt = (0.23 * size)**2 / 4.0
+    rng = np.random.default_rng(0)
+    sim = cell_model_cpp.Simulation(
+        cell_model_cpp.VectorDouble(rng.uniform(size=n)),
+        cell_model_cpp.VectorDouble(rng.uniform(size=n)), size, max_dt, 0)
+    x = np.empty(n)
+    y = np.empty(n)
+
+    start_time = time.perf_counter()
+    with TrajectoryWriter(filename, n, level=9) as writer:
+        with SnapshotWriter(writer.write, n) as snapshots:
+            write = snapshots if background else writer.write
+            for i in range(nout):
+                sim.integrate(steps * max_dt)
+                for j, p in enumerate(sim.get_positions()):
+                    x[j] = p.x
+                    y[j] = p.y
+                write(i * steps * max_dt, x, y)
+    return time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='wall time of writing snapshots inline and in the '
+                    'background')
+    parser.add_argument('--n', type=int, default=100000)
+    parser.add_argument('--nout', type=int, default=20)
+    parser.add_argument('--steps', type=int, default=5,
+                        help='time steps between snapshots')
+    parser.add_argument('-o', '--output', default='snapshots.traj')
+    args = parser.parse_args()
+
+    for background in (False, True):
+        elapsed = run(args.n, args.nout, args.steps, args.output, background)
+        print('{:>10}: {:.3f} s'.format(
+            'background' if background else 'inline', elapsed))
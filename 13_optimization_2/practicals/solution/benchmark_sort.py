@@ -0,0 +1,80 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import time
+import cell_model
+import cell_model_cpp
+
+
+def run_model(n, sort_frequency):
+    print('running with n = {}, sort_frequency = {}'.format(n, sort_frequency))
+
+    # cells that have diffused for a long time are randomly ordered in memory
+    x = np.random.uniform(0.0, 1.0, n)
+    y = np.random.uniform(0.0, 1.0, n)
+
+    # keep the number of cells per bucket constant as n increases
+    size = 0.2 / np.sqrt(n)
+    max_dt = (0.23 * size)**2 / 4.0
+    integrate_time = 100 * max_dt
+
+    # create vectorised simulation, using the Verlet lists as these gather the
+    # positions of neighbouring cells
+    sim = cell_model.Simulation(x.copy(), y.copy(), size, max_dt)
+    sim.calculate_interactions = True
+    sim.verlet_skin = size
+    sim.sort_frequency = sort_frequency
+
+    # create wrapped cpp class simulation
+    sim_cpp = cell_model_cpp.Simulation(cell_model_cpp.VectorDouble(x),
+                                        cell_model_cpp.VectorDouble(y),
+                                        size, max_dt, 0)
+    sim_cpp.set_sort_frequency(sort_frequency)
+
+    start_time = time.perf_counter()
+    sim.integrate(integrate_time)
+    end_time = time.perf_counter()
+    sim_time = end_time - start_time
+
+    start_time = time.perf_counter()
+    sim_cpp.integrate(integrate_time)
+    end_time = time.perf_counter()
+    sim_cpp_time = end_time - start_time
+
+    return sim_time, sim_cpp_time
+
+
+if __name__ == "__main__":
+
+    number_of_cells = np.array([10**i for i in np.linspace(3, 5, 5)])
+
+    # 0 disables sorting
+    sort_frequencies = [0, 1, 10, 100]
+
+    time_vectorised = np.empty((len(sort_frequencies), len(number_of_cells)))
+    time_cpp_class = np.empty((len(sort_frequencies), len(number_of_cells)))
+    for i, sort_frequency in enumerate(sort_frequencies):
+        for j, n in enumerate(number_of_cells):
+            (time_vectorised[i, j], time_cpp_class[i, j]) = \
+                run_model(int(n), sort_frequency)
+
+    print('{:>10} {:>10} {:>12} {:>12}'.format('n', 'sort freq',
+                                               'vectorised', 'cpp class'))
+    for i, sort_frequency in enumerate(sort_frequencies):
+        for j, n in enumerate(number_of_cells):
+            print('{:>10d} {:>10d} {:>12.4f} {:>12.4f}'.format(
+                int(n), sort_frequency, time_vectorised[i, j], time_cpp_class[i, j]))
+
+    plt.figure()
+    for i, sort_frequency in enumerate(sort_frequencies):
+        if sort_frequency == 0:
+            label = 'no sorting'
+        else:
+            label = 'sort every {} steps'.format(sort_frequency)
+        plt.loglog(number_of_cells, time_vectorised[i],
+                   label='vectorised, ' + label)
+        plt.loglog(number_of_cells, time_cpp_class[i], ls='--',
+                   label='cpp class, ' + label)
+    plt.xlabel('N')
+    plt.ylabel('Execution time')
+    plt.legend()
+    plt.savefig('sort_timing.png')
@@ -0,0 +1,57 @@
+import argparse
+import time
+import numpy as np
+from cell_model.runner import create_simulation, get_positions
+
+
+def run(parameters, substeps):
+    """
+    Runs the simulation given by parameters, calculating the interactions every
+    substeps steps, and returns the wall time and the final positions of the
+    cells, of shape (2, n)
+    """
+    p = dict(parameters, interaction_substeps=substeps)
+    sim = create_simulation(p)
+    start_time = time.perf_counter()
+    sim.integrate(p['end_time'])
+    elapsed = time.perf_counter() - start_time
+    return elapsed, np.array(get_positions(sim))
+
+
+def rms_distance(a, b):
+    """
+    Returns the root mean square distance between the positions a and b, using
+    the nearest periodic image
+    """
+    d = (a - b + 0.5) % 1.0 - 0.5
+    return np.sqrt(np.mean(np.sum(d**2, axis=0)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='cost and error of calculating the interactions only every '
+                    'k steps')
+    parser.add_argument('--backends', nargs='+',
+                        default=['numpy', 'cpp_functions', 'cpp'])
+    parser.add_argument('--n', type=int, default=1000)
+    parser.add_argument('--end-time', type=float, default=0.002)
+    parser.add_argument('--substeps', nargs='+', type=int,
+                        default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    # every run has the same seed and so the same diffusion noise, and the
+    # error is the distance from the run that calculates the interactions every
+    # step, relative to the distance the cells moved in that run
+    print('{:>14} {:>6} {:>10} {:>10} {:>14}'.format(
+        'backend', 'k', 'time (s)', 'speedup', 'relative error'))
+    for backend in args.backends:
+        parameters = {'backend': backend, 'n': args.n, 'nout': 1,
+                      'end_time': args.end_time, 'seed': 1}
+        start = np.array(get_positions(create_simulation(parameters)))
+        reference_time, reference = run(parameters, 1)
+        moved = rms_distance(reference, start)
+        for substeps in args.substeps:
+            elapsed, positions = run(parameters, substeps)
+            print('{:>14} {:>6d} {:>10.4f} {:>10.2f} {:>14.2e}'.format(
+                backend, substeps, elapsed, reference_time / elapsed,
+                rms_distance(positions, reference) / moved))
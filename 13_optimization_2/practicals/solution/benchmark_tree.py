@@ -0,0 +1,77 @@
+import argparse
+import time
+import numpy as np
+import cell_model_cpp
+
+
+def step(x, y, size, mode, theta=0.5):
+    """
+    Runs a single time step from positions x and y with the given
+    cell_model_cpp.InteractionMode, and returns the new positions, of shape
+    (2, n), and the wall time. The seed is fixed, so the diffusion noise is the
+    same for every mode
+    """
+    max_dt = (0.23 * size)**2 / 4.0
+    sim = cell_model_cpp.Simulation(cell_model_cpp.VectorDouble(x),
+                                    cell_model_cpp.VectorDouble(y),
+                                    size, max_dt, 0)
+    if mode == cell_model_cpp.InteractionMode.verlet:
+        # the Verlet lists are exact, with periodic images and the cutoff
+        sim.set_verlet_skin(1e-9)
+    sim.set_interaction_mode(mode)
+    sim.set_tree_theta(theta)
+    start_time = time.perf_counter()
+    sim.integrate(max_dt)
+    elapsed = time.perf_counter() - start_time
+    positions = sim.get_positions()
+    return np.array([[p.x for p in positions], [p.y for p in positions]]), elapsed
+
+
+def exact_displacement(x, y, size, chunk=500):
+    """
+    Returns the displacement of each cell by the interactions in a time step,
+    of shape (2, n), summed directly over all pairs
+    """
+    max_dt = (0.23 * size)**2 / 4.0
+    positions = np.array([x, y])
+    displacement = np.empty_like(positions)
+    for start in range(0, len(x), chunk):
+        dx = positions[:, start:start + chunk, None] - positions[:, None, :]
+        dx = (dx + 0.5) % 1.0 - 0.5
+        r = np.sqrt(dx[0]**2 + dx[1]**2)
+        within = (r > 0.0) & (r < 3 * size)
+        r[~within] = np.inf
+        tmp = (max_dt / size) * np.exp(-r / size) / r
+        displacement[:, start:start + chunk] = np.sum(tmp * dx, axis=-1)
+    return displacement
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='speed and accuracy of the Barnes-Hut interactions')
+    parser.add_argument('--n', nargs='+', type=int, default=[2000, 8000, 20000])
+    parser.add_argument('--size', type=float, default=0.1)
+    parser.add_argument('--theta', nargs='+', type=float,
+                        default=[0.0, 0.3, 0.5, 0.8])
+    args = parser.parse_args()
+
+    modes = cell_model_cpp.InteractionMode
+    rng = np.random.default_rng(0)
+    print('{:>8} {:>8} {:>12} {:>12} {:>12}'.format(
+        'n', 'theta', 'time (s)', 'speedup', 'rms error'))
+    for n in args.n:
+        x = rng.uniform(size=n)
+        y = rng.uniform(size=n)
+        reference, _ = step(x, y, args.size, modes.verlet)
+        _, hash_time = step(x, y, args.size, modes.hash)
+        print('{:>8d} {:>8} {:>12.4f}'.format(n, 'hash', hash_time))
+
+        # the error is relative to the root mean square displacement by the
+        # interactions, as the noise is the same in each run
+        scale = np.sqrt(np.mean(exact_displacement(x, y, args.size)**2))
+        for theta in args.theta:
+            positions, elapsed = step(x, y, args.size, modes.tree, theta)
+            error = (positions - reference + 0.5) % 1.0 - 0.5
+            print('{:>8d} {:>8.2f} {:>12.4f} {:>12.2f} {:>12.2e}'.format(
+                n, theta, elapsed, hash_time / elapsed,
+                np.sqrt(np.mean(error**2)) / scale))
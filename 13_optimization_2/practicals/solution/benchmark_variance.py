@@ -0,0 +1,91 @@
+import argparse
+import time
+import numpy as np
+import cell_model_cpp
+from cell_model.density import accumulate
+from cell_model.ensemble import run_ensemble
+
+n = 100
+mu, sigma = 0.5, 0.05
+end_time = 0.002
+nout = 2
+bins = (10, 10)
+
+
+def efficiency(sampling, n_samples):
+    """
+    Runs an ensemble of n_samples simulations with the given sampling, and
+    returns the mean over the bins of the squared standard error times the
+    wall time, where smaller is better
+    """
+    start_time = time.perf_counter()
+    _, error, count = run_ensemble(n_samples, 1, n=n, mu=mu, sigma=sigma,
+                                   end_time=end_time, nout=nout, bins=bins,
+                                   sampling=sampling, return_statistics=True)
+    elapsed = time.perf_counter() - start_time
+    return np.mean(error**2) * elapsed, count, elapsed
+
+
+def histogram(seed, size):
+    """
+    Returns the histogram of the cell positions at each output time of a
+    simulation with cell size size, using seed for the initial positions and
+    the noise
+    """
+    max_dt = (0.23 * size)**2 / 4.0
+    np.random.seed(seed)
+    x = np.random.normal(mu, sigma, n)
+    y = np.random.normal(mu, sigma, n)
+    sim = cell_model_cpp.Simulation(cell_model_cpp.VectorDouble(x),
+                                    cell_model_cpp.VectorDouble(y),
+                                    size, max_dt, seed)
+    xs = np.empty((n, nout))
+    ys = np.empty((n, nout))
+    for i in range(nout):
+        sim.integrate(end_time / nout)
+        for j, p in enumerate(sim.get_positions()):
+            xs[j, i] = p.x
+            ys[j, i] = p.y
+    return accumulate(xs, ys, bins)
+
+
+def difference_variance(sizes, replicates, common):
+    """
+    Returns the mean over the bins of the variance of the difference between
+    the histograms of two simulations with cell sizes sizes[0] and sizes[1].
+    If common is True both use the same seed (common random numbers)
+    """
+    differences = []
+    for i in range(replicates):
+        other = i if common else replicates + i
+        differences.append(histogram(i, sizes[0]) - histogram(other, sizes[1]))
+    return np.mean(np.var(differences, axis=0, ddof=1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='efficiency of the variance reduction sampling modes')
+    parser.add_argument('--samples', type=int, default=200,
+                        help='simulations in each ensemble')
+    parser.add_argument('--replicates', type=int, default=100,
+                        help='pairs of simulations for each difference')
+    args = parser.parse_args()
+
+    # efficiency is the variance times the cost, so an antithetic ensemble of
+    # the same number of simulations is better if its ratio is below 1
+    results = {sampling: efficiency(sampling, args.samples)
+               for sampling in ('independent', 'antithetic')}
+    for sampling, (value, count, elapsed) in results.items():
+        print('{:>12}: {:4d} samples in {:.3f} s, SE^2 x time = {:.3e}'.format(
+            sampling, count, elapsed, value))
+    print('antithetic / independent efficiency ratio: {:.3f}'.format(
+        results['antithetic'][0] / results['independent'][0]))
+
+    # both estimates of a difference cost the same, so the variance ratio is
+    # also the efficiency ratio
+    sizes = (0.02, 0.025)
+    independent = difference_variance(sizes, args.replicates, False)
+    common = difference_variance(sizes, args.replicates, True)
+    print('variance of difference between sizes {} and {}: independent seeds '
+          '{:.4f}, common random numbers {:.4f}, ratio {:.3f}'.format(
+              sizes[0], sizes[1], independent, common, common / independent))
@@ -1,7 +1,10 @@
 import numpy as np
 
+from .neighbours import find_pairs, morton_codes
+from .rng import make_generator
+
 class Simulation:
-    def __init__(self, x, y, size, max_dt):
+    def __init__(self, x, y, size, max_dt, seed=None):
         """
         Creates a new simulation objects that implements the cell model with diffusion
         and excluded volume interactions. Cells are defined on a unit square domain and
@@ -22,6 +25,10 @@ class Simulation:
         max_dt: float
             maximum timestep for the simulation
 
+        seed: int or np.random.SeedSequence
+            seed for the simulation's own random number generator. Use
+            cell_model.rng.spawn to seed each simulation of an ensemble
+
         """
         self.x = x
         self.y = y
@@ -34,6 +41,53 @@ class Simulation:
 
         self.calculate_interactions = False
 
+        # the diffusion noise for noise_steps steps at a time is drawn in one
+        # call into self.noise, and self.noise_index is the next unused step
+        self.rng = make_generator(seed)
+        self.noise_steps = max(1, min(64, 2**19 // max(len(x), 1)))
+        self.noise = np.empty((self.noise_steps, 2, len(x)))
+        self.noise_index = self.noise_steps
+
+        # an antithetic simulation uses the negated diffusion noise of the
+        # simulation with the same seed, so that the pair is negatively
+        # correlated
+        self.antithetic = False
+
+        # Verlet neighbour lists are used for the interactions if verlet_skin is
+        # set. Pairs closer than cutoff + verlet_skin (using the nearest periodic
+        # image) are stored, and the lists are only rebuilt once a cell has
+        # moved more than verlet_skin / 2
+        self.cutoff = 3.0 * size
+        self.verlet_skin = None
+        self.pairs = None
+        self.x_at_rebuild = np.empty_like(x)
+        self.y_at_rebuild = np.empty_like(y)
+
+        # every sort_frequency steps the cells are sorted along a Morton curve so
+        # that neighbouring cells are close together in memory. self.x and self.y
+        # are then stored in sorted order, and ids[k] is the original index of
+        # the cell stored at k. Use get_positions for the original order
+        self.sort_frequency = 0
+        self.ids = np.arange(len(x))
+
+        self.n_steps = 0
+        self.time = 0.0
+        self.n_rebuilds = 0
+        self.n_sorts = 0
+
+        # n x n work buffers of self.interactions, only allocated when they are
+        # first needed so that the Verlet lists do not pay for them
+        self.pair_buffers = None
+        self.force = np.empty((2, len(x)))
+
+        # the interactions are only calculated every interaction_substeps steps,
+        # and the displacement per unit time that they give (the drift) is
+        # reused for the steps in between. drift_age is the number of steps
+        # since it was calculated, None if it must be recalculated
+        self.interaction_substeps = 1
+        self.drift = np.empty((2, len(x)))
+        self.drift_age = None
+
     def boundaries(self, dt):
         """
         Any cells that are over the boundary of the domain are translated to the
@@ -41,10 +95,8 @@ class Simulation:
 
         Updates self.xn and self.yn with the new position of the cells
         """
-        self.xn = np.where(self.xn < 0.0, - self.xn, self.xn)
-        self.xn = np.where(self.xn > 1.0, self.xn - 1.0, self.xn)
-        self.yn = np.where(self.yn < 0.0, - self.yn, self.yn)
-        self.yn = np.where(self.yn > 1.0, self.yn - 1.0, self.yn)
+        np.mod(self.xn, 1.0, out=self.xn)
+        np.mod(self.yn, 1.0, out=self.yn)
 
     def diffusion(self, dt):
         """
@@ -52,9 +104,19 @@ class Simulation:
 
         Updates self.xn and self.yn with the new position of the cells
         """
-        r = np.random.randn(2, len(self.xn))
-        self.xn += np.sqrt(2.0 * dt) * r[0, :]
-        self.yn += np.sqrt(2.0 * dt) * r[1, :]
+        if self.noise_index == self.noise_steps:
+            self.rng.standard_normal(out=self.noise)
+            self.noise_index = 0
+        r = self.noise[self.noise_index]
+        self.noise_index += 1
+
+        # the noise is not used again, so it is scaled in place
+        if self.antithetic:
+            r *= -np.sqrt(2.0 * dt)
+        else:
+            r *= np.sqrt(2.0 * dt)
+        self.xn += r[0, :]
+        self.yn += r[1, :]
 
     def interactions(self, dt):
         """
@@ -66,11 +128,166 @@ class Simulation:
         Updates self.xn and self.yn with the new position of the cells
         """
         n = len(self.x)
-        dx = self.x.reshape((1, n)) - self.x.reshape((n, 1))
-        dy = self.y.reshape((1, n)) - self.y.reshape((n, 1))
+        if self.pair_buffers is None:
+            self.pair_buffers = (np.empty((n, n)), np.empty((n, n)),
+                                 np.empty((n, n)), np.empty((n, n)),
+                                 np.empty((n, n), dtype=bool))
+        dx, dy, r, f, coincident = self.pair_buffers
+
+        # dx[i, j] = x[j] - x[i]. The broadcasts are done as copies, as a
+        # broadcasting ufunc allocates a scratch buffer on every call
+        np.copyto(dx, self.x)
+        np.copyto(r, self.x.reshape((n, 1)))
+        dx -= r
+        np.copyto(dy, self.y)
+        np.copyto(r, self.y.reshape((n, 1)))
+        dy -= r
+        np.multiply(dx, dx, out=r)
+        np.multiply(dy, dy, out=f)
+        r += f
+        np.sqrt(r, out=r)
+
+        # coincident cells (including each cell with itself) are moved to an
+        # infinite distance, so that they exert no force
+        np.equal(r, 0.0, out=coincident)
+        np.copyto(r, np.inf, where=coincident)
+
+        # f = (dt/size) exp(-r/size) / r
+        np.divide(r, -self.size, out=f)
+        np.exp(f, out=f)
+        f *= dt / self.size
+        f /= r
+
+        dx *= f
+        dy *= f
+        np.sum(dx, axis=1, out=self.force[0])
+        np.sum(dy, axis=1, out=self.force[1])
+        self.xn += self.force[0]
+        self.yn += self.force[1]
+
+    def build_neighbour_list(self):
+        """
+        Stores all pairs of cells closer than self.cutoff + self.verlet_skin in
+        self.pairs, along with the current positions of the cells. Each pair is
+        only stored once
+        """
+        i, j = find_pairs(self.x, self.y, self.cutoff + self.verlet_skin,
+                          periodic=True)
+        self.pairs = (i[i < j], j[i < j])
+        self.x_at_rebuild[:] = self.x
+        self.y_at_rebuild[:] = self.y
+        self.n_rebuilds += 1
+
+    def neighbour_list_is_valid(self):
+        """
+        Returns True if no cell has moved more than half the skin distance since
+        the Verlet lists were last built
+        """
+        if self.pairs is None:
+            return False
+        dx = self.x - self.x_at_rebuild
+        dy = self.y - self.y_at_rebuild
+        dx -= np.round(dx)
+        dy -= np.round(dy)
+        dr2 = dx**2 + dy**2
+        return np.max(dr2, initial=0.0) <= (0.5 * self.verlet_skin)**2
+
+    def interactions_verlet(self, dt):
+        """
+        Calculates the same interactions as self.interactions, but only between
+        pairs of cells in the Verlet lists that are within self.cutoff. Cells
+        interact with the nearest periodic image of their neighbours, and each
+        pair updates both of its cells
+
+        Uses self.x and self.y as the current positions of the cells
+
+        Updates self.xn and self.yn with the new position of the cells
+        """
+        if not self.neighbour_list_is_valid():
+            self.build_neighbour_list()
+
+        i, j = self.pairs
+        dx = self.x[j] - self.x[i]
+        dy = self.y[j] - self.y[i]
+        dx -= np.round(dx)
+        dy -= np.round(dy)
         r = np.sqrt(dx**2 + dy**2)
-        self.xn += np.nansum((dt/self.size) * np.exp(-r/self.size) * dx / r, axis=1)
-        self.yn += np.nansum((dt/self.size) * np.exp(-r/self.size) * dy / r, axis=1)
+        f = np.zeros_like(r)
+        np.divide((dt/self.size) * np.exp(-r/self.size), r, out=f,
+                  where=(r > 0.0) & (r < self.cutoff))
+        n = len(self.x)
+        fx = f * dx
+        fy = f * dy
+        self.xn += np.bincount(i, weights=fx, minlength=n)
+        self.xn -= np.bincount(j, weights=fx, minlength=n)
+        self.yn += np.bincount(i, weights=fy, minlength=n)
+        self.yn -= np.bincount(j, weights=fy, minlength=n)
+
+    def interactions_substep(self, dt):
+        """
+        Calculates the interactions with self.interactions or
+        self.interactions_verlet every self.interaction_substeps steps, and
+        otherwise moves the cells by the drift from the last calculation
+
+        Updates self.xn and self.yn with the new position of the cells
+        """
+        if self.interaction_substeps > 1 and self.drift_age is not None and \
+                self.drift_age < self.interaction_substeps:
+            np.multiply(self.drift, dt, out=self.force)
+            self.xn += self.force[0]
+            self.yn += self.force[1]
+            self.drift_age += 1
+            return
+
+        if self.verlet_skin is None:
+            self.interactions(dt)
+        else:
+            self.interactions_verlet(dt)
+
+        if self.interaction_substeps > 1:
+            np.subtract(self.xn, self.x, out=self.drift[0])
+            np.subtract(self.yn, self.y, out=self.drift[1])
+            self.drift /= dt
+            self.drift_age = 1
+
+    def sort_cells(self):
+        """
+        Reorders self.x and self.y along a Morton curve, keeping track of the
+        original index of each cell in self.ids
+        """
+        order = np.argsort(morton_codes(self.x, self.y), kind='stable')
+        self.x[:] = self.x[order]
+        self.y[:] = self.y[order]
+        self.ids[:] = self.ids[order]
+
+        # the Verlet lists and the drift refer to the old order of the cells
+        self.pairs = None
+        self.drift_age = None
+        self.n_sorts += 1
+
+    def get_positions(self):
+        """
+        Returns copies of the x and y positions of the cells, in the same order
+        as the positions originally given to the simulation
+        """
+        x = np.empty_like(self.x)
+        y = np.empty_like(self.y)
+        x[self.ids] = self.x
+        y[self.ids] = self.y
+        return x, y
+
+    def get_statistics(self):
+        """
+        Returns a dict with the number of steps taken, the number of Verlet list
+        rebuilds, the fraction of steps that needed a rebuild and the number of
+        times the cells were sorted
+        """
+        return {
+            'steps': self.n_steps,
+            'rebuilds': self.n_rebuilds,
+            'rebuild_frequency': self.n_rebuilds / max(self.n_steps, 1),
+            'sorts': self.n_sorts,
+        }
 
     def step(self, dt):
         """
@@ -80,33 +297,47 @@ class Simulation:
         which will now represent the "next" position of the cells after the current
         time-step
 
-        The self.interactions, self.diffusion and self.boundaries functions update the
-        "next" position of the cells according to the cell-cell excluded volume
-        interactions, the diffusion step and the boundaries respectivly
+        The self.interactions_substep, self.diffusion and self.boundaries functions
+        update the "next" position of the cells according to the cell-cell excluded
+        volume interactions, the diffusion step and the boundaries respectivly
 
         Finally, the current position of the cells is set to the calculated "next"
         position, and the simulation is ready for a new time-step.
 
         """
+        if self.sort_frequency and self.n_steps % self.sort_frequency == 0:
+            self.sort_cells()
+
         self.xn[:] = self.x
         self.yn[:] = self.y
 
         if self.calculate_interactions:
-            self.interactions(dt)
+            self.interactions_substep(dt)
         self.diffusion(dt)
         self.boundaries(dt)
 
         self.x[:] = self.xn
         self.y[:] = self.yn
+        self.n_steps += 1
+        self.time += dt
 
-    def integrate(self, period):
+    def integrate(self, period, observables=()):
         """
         integrate over a time period given by period (float).
+
+        Each of observables (see cell_model.observables) is updated every
+        observable.every steps
         """
+        for observable in observables:
+            observable.attach(self)
 
         n = int(np.floor(period / self.max_dt))
         for i in range(n):
             self.step(self.max_dt)
+            for observable in observables:
+                observable.observe(self)
         final_dt = period - self.max_dt*n
         if final_dt > 0:
             self.step(final_dt)
+            for observable in observables:
+                observable.observe(self)
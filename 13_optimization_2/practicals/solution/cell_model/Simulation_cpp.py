@@ -1,8 +1,10 @@
 import numpy as np
 import cell_model_cpp
 
+from .rng import make_generator
+
 class Simulation_cpp:
-    def __init__(self, x, y, size, max_dt):
+    def __init__(self, x, y, size, max_dt, seed=None):
         """
         Creates a new simulation objects that implements the cell model with diffusion
         and excluded volume interactions. Cells are defined on a unit square domain and
@@ -23,6 +25,10 @@ class Simulation_cpp:
         max_dt: float
             maximum timestep for the simulation
 
+        seed: int or np.random.SeedSequence
+            seed for the random number generator of integrate. The step method
+            uses the global generator of cell_model_cpp
+
         """
         self.x = x
         self.y = y
@@ -35,6 +41,19 @@ class Simulation_cpp:
 
         self.calculate_interactions = False
 
+        # the interactions are only calculated every interaction_substeps steps,
+        # and the displacement per unit time that they give (the drift) is
+        # reused for the steps in between. drift_age is the number of steps
+        # since it was calculated, None if it must be recalculated
+        self.interaction_substeps = 1
+        self.drift = np.empty((2, len(x)))
+        self.drift_age = None
+
+        self.rng = make_generator(seed)
+
+        self.n_steps = 0
+        self.time = 0.0
+
     def boundaries(self, dt):
         """
         Any cells that are over the boundary of the domain are translated to the
@@ -63,6 +82,35 @@ class Simulation_cpp:
         """
         cell_model_cpp.interactions(self.xn, self.yn, self.x, self.y, dt, self.size)
 
+    def interactions_substep(self, dt):
+        """
+        Calculates the interactions with self.interactions every
+        self.interaction_substeps steps, and otherwise moves the cells by the
+        drift from the last calculation
+
+        Updates self.xn and self.yn with the new position of the cells
+        """
+        if self.interaction_substeps > 1 and self.drift_age is not None and \
+                self.drift_age < self.interaction_substeps:
+            self.xn += dt * self.drift[0]
+            self.yn += dt * self.drift[1]
+            self.drift_age += 1
+            return
+
+        self.interactions(dt)
+
+        if self.interaction_substeps > 1:
+            np.subtract(self.xn, self.x, out=self.drift[0])
+            np.subtract(self.yn, self.y, out=self.drift[1])
+            self.drift /= dt
+            self.drift_age = 1
+
+    def get_positions(self):
+        """
+        Returns copies of the x and y positions of the cells
+        """
+        return self.x.copy(), self.y.copy()
+
     def step(self, dt):
         """
         Perform a single time step for the simulation
@@ -71,9 +119,9 @@ class Simulation_cpp:
         which will now represent the "next" position of the cells after the current
         time-step
 
-        The self.interactions, self.diffusion and self.boundaries functions update the
-        "next" position of the cells according to the cell-cell excluded volume
-        interactions, the diffusion step and the boundaries respectivly
+        The self.interactions_substep, self.diffusion and self.boundaries functions
+        update the "next" position of the cells according to the cell-cell excluded
+        volume interactions, the diffusion step and the boundaries respectivly
 
         Finally, the current position of the cells is set to the calculated "next"
         position, and the simulation is ready for a new time-step.
@@ -83,21 +131,46 @@ class Simulation_cpp:
         self.yn[:] = self.y
 
         if self.calculate_interactions:
-            self.interactions(dt)
+            self.interactions_substep(dt)
         self.diffusion(dt)
         self.boundaries(dt)
 
         self.x[:] = self.xn
         self.y[:] = self.yn
+        self.n_steps += 1
+        self.time += dt
 
-    def integrate(self, period):
+    def integrate(self, period, observables=()):
         """
         integrate over a time period given by period (float).
-        """
 
+        The whole time loop is run in C++ by a single call to
+        cell_model_cpp.integrate, unless there are observables (see
+        cell_model.observables), which are updated every observable.every steps.
+        The C++ loop starts each period by calculating the interactions
+        """
         n = int(np.floor(period / self.max_dt))
+        final_dt = period - self.max_dt*n
+
+        if not observables:
+            seed = int(self.rng.integers(2**32))
+            cell_model_cpp.integrate(self.x, self.y, period, self.max_dt,
+                                     self.size, seed,
+                                     self.calculate_interactions,
+                                     self.interaction_substeps)
+            self.drift_age = None
+            self.n_steps += n + (final_dt > 0)
+            self.time += period
+            return
+
+        for observable in observables:
+            observable.attach(self)
+
         for i in range(n):
             self.step(self.max_dt)
-        final_dt = period - self.max_dt*n
+            for observable in observables:
+                observable.observe(self)
         if final_dt > 0:
             self.step(final_dt)
+            for observable in observables:
+                observable.observe(self)
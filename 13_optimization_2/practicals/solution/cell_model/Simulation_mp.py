@@ -0,0 +1,294 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+from .neighbours import find_pairs
+from .rng import make_generator, spawn
+
+
+def _attach(name, n):
+    """
+    Attaches to the shared memory block called name and returns it, along with
+    a (5, n) array view holding x, y, xn, yn and the x positions when the
+    workers last found their candidate cells
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray((5, n), dtype=np.float64, buffer=shm.buf)
+
+
+def _strip(x, n_strips):
+    """
+    Returns the index of the strip that owns each of the x positions
+    """
+    return np.minimum((x * n_strips).astype(np.intp), n_strips - 1)
+
+
+def _halo(x, others, rank, n_processes, distance):
+    """
+    Returns the cells of others, an array of indices of cells outside the strip
+    of rank, that are within distance of the strip. If that halo would wrap
+    around onto the strip itself all of them are returned
+    """
+    width = 1.0 / n_processes
+    lo = rank * width
+    if width + 2 * distance >= 1.0:
+        return others
+    x_others = x[others]
+    near = ((np.mod(lo - x_others, 1.0) < distance) |
+            (np.mod(x_others - (lo + width), 1.0) < distance))
+    return others[near]
+
+
+def _interactions(x, y, owned, halo, rank, n_processes, size, cutoff, dt):
+    """
+    Returns the displacement in x and in y of each cell of owned, the cells in
+    the strip of rank, by its interactions with all the cells within cutoff,
+    using the nearest periodic image of each. halo holds the other cells, as
+    given by _halo with distance cutoff
+    """
+    n_owned = len(owned)
+    width = 1.0 / n_processes
+    lo = rank * width
+    local = np.concatenate((owned, halo))
+
+    if width + 2 * cutoff < 1.0:
+        # the halo cells are read straight from the neighbouring strips in the
+        # shared arrays. Local x coordinates start at the left edge of the halo
+        # so that they do not need to wrap around the domain
+        x_local = np.mod(x[local] - (lo - cutoff), 1.0)
+        i, j = find_pairs(x_local, y[local], cutoff, periodic=(False, True),
+                          box=(width + 2 * cutoff, 1.0))
+    else:
+        # the halo would wrap around onto the strip itself, so every cell is
+        # searched, with the owned cells first
+        x_local = x[local]
+        i, j = find_pairs(x_local, y[local], cutoff, periodic=True)
+
+    # only the forces on the owned cells are needed
+    i, j = i[i < n_owned], j[i < n_owned]
+    dx = x_local[i] - x_local[j]
+    dx -= np.round(dx)
+    dy = y[local[i]] - y[local[j]]
+    dy -= np.round(dy)
+    r = np.sqrt(dx**2 + dy**2)
+    f = np.zeros_like(r)
+    np.divide((dt/size) * np.exp(-r/size), r, out=f, where=r > 0.0)
+    return (np.bincount(i, weights=f * dx, minlength=n_owned),
+            np.bincount(i, weights=f * dy, minlength=n_owned))
+
+
+def _worker(rank, n_processes, name, command_name, n, size, cutoff,
+            seed_sequence, start_barrier, step_barrier):
+    """
+    Main loop of a worker process, which owns all the cells with an x position in
+    the strip [rank / n_processes, (rank + 1) / n_processes)
+    """
+    shm, positions = _attach(name, n)
+    command_shm = shared_memory.SharedMemory(name=command_name)
+    command = np.ndarray(5 + n_processes, dtype=np.float64,
+                         buffer=command_shm.buf)
+    x, y, xn, yn, x_rebuild = positions
+    moved = command[5:]
+    rng = make_generator(seed_sequence)
+
+    # only the cells within cutoff + skin of the strip when the candidates were
+    # last found can be owned by this worker or be in its halo, until a cell
+    # has moved skin in x since then, so each step only looks at those
+    skin = cutoff
+    candidates = None
+
+    def find_candidates():
+        nonlocal candidates
+        in_strip = _strip(x, n_processes) == rank
+        owned = np.nonzero(in_strip)[0]
+        halo = _halo(x, np.nonzero(~in_strip)[0], rank, n_processes,
+                     cutoff + skin)
+        candidates = np.sort(np.concatenate((owned, halo)))
+        x_rebuild[owned] = x[owned]
+
+    def step(dt, calculate_interactions):
+        # cells are owned by the strip they are in at the start of the step, so
+        # cells that crossed into a neighbouring strip during the last step have
+        # migrated to their new owner
+        in_strip = _strip(x[candidates], n_processes) == rank
+        owned = candidates[in_strip]
+        n_owned = len(owned)
+
+        x_owned = x[owned]
+        y_owned = y[owned]
+        xn_owned = x_owned.copy()
+        yn_owned = y_owned.copy()
+
+        if calculate_interactions:
+            halo = _halo(x, candidates[~in_strip], rank, n_processes, cutoff)
+            dx_owned, dy_owned = _interactions(x, y, owned, halo, rank,
+                                               n_processes, size, cutoff, dt)
+            xn_owned += dx_owned
+            yn_owned += dy_owned
+
+        r = rng.standard_normal((2, n_owned))
+        xn_owned += np.sqrt(2.0 * dt) * r[0]
+        yn_owned += np.sqrt(2.0 * dt) * r[1]
+
+        xn[owned] = np.mod(xn_owned, 1.0)
+        yn[owned] = np.mod(yn_owned, 1.0)
+        moved_x = xn_owned - x_rebuild[owned]
+        moved_x -= np.round(moved_x)
+        moved[rank] = np.max(np.abs(moved_x), initial=0.0)
+
+        # wait until every worker has finished reading the current positions
+        # before overwriting them. The candidates are found again once any cell
+        # has moved too far, which every worker sees at the same time
+        step_barrier.wait()
+        rebuild = np.max(moved) >= skin
+        x[owned] = xn[owned]
+        y[owned] = yn[owned]
+        step_barrier.wait()
+        if rebuild:
+            find_candidates()
+
+    try:
+        while True:
+            start_barrier.wait()
+            (n_steps, dt, final_dt, calculate_interactions,
+             finished) = command[:5]
+            if finished:
+                break
+            # the positions may have been changed between the calls
+            find_candidates()
+            for _ in range(int(n_steps)):
+                step(dt, calculate_interactions)
+            if final_dt > 0:
+                step(final_dt, calculate_interactions)
+            start_barrier.wait()
+    except Exception:
+        # wake up the other processes rather than leaving them waiting
+        start_barrier.abort()
+        step_barrier.abort()
+        raise
+    finally:
+        del x, y, xn, yn, x_rebuild, positions, command, moved
+        shm.close()
+        command_shm.close()
+
+
+class Simulation_mp:
+    def __init__(self, x, y, size, max_dt, n_processes=None, seed=None):
+        """
+        Creates a new simulation objects that implements the cell model with diffusion
+        and excluded volume interactions, using several worker processes for a single
+        large simulation. Cells are defined on a unit square domain and periodic
+        boundary condtions are implemented
+
+        The domain is split into vertical strips, each owned by one worker process.
+        The positions of all the cells are held in shared memory, so each worker
+        reads the halo of cells within one cutoff of its strip directly from its
+        neighbours, and cells migrate between workers as they cross the strips.
+        Each worker only scans all the cells when one has moved more than a
+        cutoff since the last scan, and otherwise only looks at the cells it
+        found near its strip then
+
+        Parameters
+        ----------
+
+        x: np.ndarray
+            array of x positions of the cells
+
+        y: np.ndarray
+            array of y positions of the cells. Must be same length as x
+
+        size: float
+            size of cells
+
+        max_dt: float
+            maximum timestep for the simulation
+
+        n_processes: int
+            number of worker processes, defaults to the number of cpus
+
+        seed: int or np.random.SeedSequence
+            seed for the random number generators of the workers
+
+        """
+        if n_processes is None:
+            n_processes = mp.cpu_count()
+        self.n_processes = n_processes
+        self.max_dt = max_dt
+        self.size = size
+
+        # interactions are cut off at the same distance as the Verlet lists of the
+        # other simulations
+        self.cutoff = 3.0 * size
+
+        self.calculate_interactions = False
+
+        n = len(x)
+        self.shm = shared_memory.SharedMemory(create=True, size=5 * n * 8)
+        # the command to the workers, followed by the distance each worker's
+        # cells have moved
+        self.command_shm = shared_memory.SharedMemory(
+            create=True, size=(5 + n_processes) * 8)
+        positions = np.ndarray((5, n), dtype=np.float64, buffer=self.shm.buf)
+        self.command = np.ndarray(5 + n_processes, dtype=np.float64,
+                                  buffer=self.command_shm.buf)
+        positions[0] = x
+        positions[1] = y
+        self.x = positions[0]
+        self.y = positions[1]
+
+        self.start_barrier = mp.Barrier(n_processes + 1)
+        step_barrier = mp.Barrier(n_processes)
+        seed_sequences = spawn(seed, n_processes)
+        self.processes = [
+            mp.Process(target=_worker,
+                       args=(rank, n_processes, self.shm.name,
+                             self.command_shm.name, n, size, self.cutoff,
+                             seed_sequences[rank], self.start_barrier,
+                             step_barrier),
+                       daemon=True)
+            for rank in range(n_processes)
+        ]
+        for p in self.processes:
+            p.start()
+
+    def integrate(self, period):
+        """
+        integrate over a time period given by period (float).
+        """
+
+        n = int(np.floor(period / self.max_dt))
+        final_dt = period - self.max_dt*n
+        self.command[:5] = (n, self.max_dt, final_dt,
+                            self.calculate_interactions, 0)
+
+        # the workers start when all processes reach the first barrier, and have
+        # finished when all reach the second
+        self.start_barrier.wait()
+        self.start_barrier.wait()
+
+    def close(self):
+        """
+        Stops the worker processes and frees the shared memory. self.x and self.y
+        are replaced by copies so they can still be used afterwards
+        """
+        if self.processes is None:
+            return
+        self.command[4] = 1
+        self.start_barrier.wait()
+        for p in self.processes:
+            p.join()
+        self.processes = None
+
+        self.x = self.x.copy()
+        self.y = self.y.copy()
+        del self.command
+        self.shm.close()
+        self.shm.unlink()
+        self.command_shm.close()
+        self.command_shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
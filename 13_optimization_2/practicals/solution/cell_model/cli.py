@@ -0,0 +1,268 @@
+import argparse
+import inspect
+import json
+import os
+import sys
+import time
+import numpy as np
+
+from .runner import complete_parameters, run_simulation
+
+
+def load_config(filename):
+    """
+    Reads a dict of parameters from a .toml or .json file. No filename gives an
+    empty dict
+    """
+    if filename is None:
+        return {}
+    if os.path.splitext(filename)[1] == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib
+        with open(filename, 'rb') as f:
+            return tomllib.load(f)
+    with open(filename) as f:
+        return json.load(f)
+
+
+def config_error(command, filename, error):
+    """
+    Exits with an error message for the config file filename of command
+    """
+    sys.exit('cell-model {}: error: {}: {}'.format(command, filename, error))
+
+
+def plot_cells(result, size, prefix):
+    """
+    Saves an image of the cells at each output time as prefix_i.png
+    """
+    from .render import render
+
+    render(result['x'], result['y'], size, prefix + '_{}.png')
+
+
+def plot_histogram(result, prefix):
+    """
+    Saves an image of the histogram at each output time as prefix_i.png
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    f = plt.figure()
+    vmin = np.min(result)
+    vmax = np.max(result)
+    for i in range(result.shape[-1]):
+        f.clear()
+        plt.imshow(result[..., i], vmin=vmin, vmax=vmax)
+        f.savefig('{}_{}.png'.format(prefix, i))
+
+
+def load_positions(filename):
+    """
+    Returns the x and y positions of the cells at each output time, from a .npz
+    file or a trajectory file written by run
+    """
+    if os.path.splitext(filename)[1] == '.traj':
+        from .trajectory import TrajectoryReader
+
+        with TrajectoryReader(filename) as reader:
+            _, x, y = reader.read()
+        return x, y
+    with np.load(filename) as result:
+        return result['x'], result['y']
+
+
+def run(args):
+    parameters = load_config(args.config)
+    if args.backend is not None:
+        parameters['backend'] = args.backend
+    try:
+        parameters = complete_parameters(parameters)
+    except ValueError as e:
+        config_error('run', args.config, e)
+
+    # a .traj output is written by a background thread as the simulation runs,
+    # see cell_model.trajectory and cell_model.snapshots
+    writer = None
+    callback = None
+    if os.path.splitext(args.output)[1] == '.traj':
+        from .snapshots import SnapshotWriter
+        from .trajectory import TrajectoryWriter
+
+        writer = TrajectoryWriter(args.output, parameters['n'], args.bits)
+        snapshots = SnapshotWriter(writer.write, parameters['n'])
+        times = parameters['end_time'] / parameters['nout'] * np.arange(
+            1, parameters['nout'] + 1)
+
+        def callback(i, x, y):
+            snapshots(times[i], x, y)
+
+    start_time = time.perf_counter()
+    try:
+        result = run_simulation(parameters, callback)
+    finally:
+        if writer is not None:
+            try:
+                snapshots.close()
+            finally:
+                writer.close()
+    print('finished simulation, time taken was {}'.format(
+        time.perf_counter() - start_time))
+
+    if writer is None:
+        np.savez(args.output, **result)
+    if args.plot:
+        plot_cells(result, parameters['size'],
+                   os.path.splitext(args.output)[0])
+
+
+def ensemble(args):
+    from .ensemble import run_ensemble
+
+    parameters = load_config(args.config)
+    unknown = set(parameters) - set(inspect.signature(run_ensemble).parameters)
+    if unknown:
+        config_error('ensemble', args.config,
+                     'unknown parameters: {}'.format(sorted(unknown)))
+    if 'bins' in parameters:
+        parameters['bins'] = tuple(parameters['bins'])
+
+    start_time = time.perf_counter()
+    result = run_ensemble(**parameters)
+    print('finished ensemble, time taken was {}'.format(
+        time.perf_counter() - start_time))
+
+    np.savez(args.output, histogram=result)
+    if args.plot:
+        plot_histogram(result, os.path.splitext(args.output)[0])
+
+
+def render(args):
+    from .render import render
+
+    x, y = load_positions(args.positions)
+    start_time = time.perf_counter()
+    render(x, y, args.size, args.output, args.resolution, args.fps,
+           args.processes)
+    print('finished rendering, time taken was {}'.format(
+        time.perf_counter() - start_time))
+
+
+def bench(args):
+    parameters = load_config(args.config)
+    try:
+        complete_parameters(parameters)
+    except ValueError as e:
+        config_error('bench', args.config, e)
+    results = []
+    print('{:>15} {:>10} {:>12}'.format('backend', 'n', 'time (s)'))
+    for backend in args.backends:
+        for n in args.n:
+            p = dict(parameters, backend=backend, n=n)
+            start_time = time.perf_counter()
+            run_simulation(p)
+            elapsed = time.perf_counter() - start_time
+            print('{:>15} {:>10} {:>12.4f}'.format(backend, n, elapsed))
+            results.append({'backend': backend, 'n': n, 'time': elapsed})
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+def sweep(args):
+    from .sweep import run_sweep, write_table
+
+    grid = load_config(args.config)
+    try:
+        rows = run_sweep(grid, args.store, args.processes)
+    except ValueError as e:
+        config_error('sweep', args.config, e)
+    if args.output is None:
+        write_table(rows, sys.stdout)
+    else:
+        with open(args.output, 'w', newline='') as f:
+            write_table(rows, f)
+
+
+def main(argv=None):
+    """
+    Entry point of the cell-model command
+    """
+    parser = argparse.ArgumentParser(
+        prog='cell-model',
+        description='run cell diffusion and excluded volume simulations')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_run = subparsers.add_parser(
+        'run', help='run a single simulation and save the cell positions')
+    parser_run.add_argument('config', nargs='?',
+                            help='.toml or .json file of simulation parameters')
+    parser_run.add_argument('--backend',
+                            choices=['numpy', 'cpp_functions', 'cpp', 'mp'])
+    parser_run.add_argument('-o', '--output', default='cells.npz',
+                            help='.npz or compressed .traj file to write the '
+                            'positions to')
+    parser_run.add_argument('--bits', type=int, choices=[16, 32], default=16,
+                            help='precision of the positions in a .traj file')
+    parser_run.add_argument('--plot', action='store_true',
+                            help='also save an image of each output step')
+    parser_run.set_defaults(func=run)
+
+    parser_ensemble = subparsers.add_parser(
+        'ensemble', help='run an ensemble and save the mean histogram')
+    parser_ensemble.add_argument('config', nargs='?',
+                                 help='.toml or .json file of ensemble parameters')
+    parser_ensemble.add_argument('-o', '--output', default='histogram.npz',
+                                 help='.npz file to write the histogram to')
+    parser_ensemble.add_argument('--plot', action='store_true',
+                                 help='also save an image of each output step')
+    parser_ensemble.set_defaults(func=ensemble)
+
+    parser_render = subparsers.add_parser(
+        'render', help='render the positions saved by run as images or video')
+    parser_render.add_argument('positions',
+                               help='.npz or .traj file written by run')
+    parser_render.add_argument('-o', '--output', default='cells.mp4',
+                               help='video file, or image filenames with {}')
+    parser_render.add_argument('--size', type=float, default=0.02,
+                               help='radius of the cells')
+    parser_render.add_argument('--resolution', type=int, default=512)
+    parser_render.add_argument('--fps', type=int, default=10)
+    parser_render.add_argument('--processes', type=int,
+                               help='number of worker processes')
+    parser_render.set_defaults(func=render)
+
+    parser_bench = subparsers.add_parser(
+        'bench', help='time the backends for different numbers of cells')
+    parser_bench.add_argument('config', nargs='?',
+                              help='.toml or .json file of simulation parameters')
+    parser_bench.add_argument('--backends', nargs='+',
+                              default=['numpy', 'cpp_functions', 'cpp'])
+    parser_bench.add_argument('--n', nargs='+', type=int,
+                              default=[100, 300, 1000])
+    parser_bench.add_argument('-o', '--output',
+                              help='.json file to write the timings to')
+    parser_bench.set_defaults(func=bench)
+
+    parser_sweep = subparsers.add_parser(
+        'sweep', help='run a simulation for every point of a parameter grid')
+    parser_sweep.add_argument('config',
+                              help='.toml or .json file of lists of parameters')
+    parser_sweep.add_argument('--store', default='results',
+                              help='directory of the result store')
+    parser_sweep.add_argument('--processes', type=int,
+                              help='number of worker processes')
+    parser_sweep.add_argument('-o', '--output',
+                              help='.csv file to write the results table to')
+    parser_sweep.set_defaults(func=sweep)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import math
+import numpy as np
+
+
+def bin_index(x, y, bins):
+    """
+    Returns the flat index of the bin of a uniform grid of bins[0] x bins[1]
+    bins on the unit square that contains each position. Positions on or
+    outside the boundary are put in the nearest bin
+    """
+    ix = np.clip((np.asarray(x) * bins[0]).astype(np.int64), 0, bins[0] - 1)
+    iy = np.clip((np.asarray(y) * bins[1]).astype(np.int64), 0, bins[1] - 1)
+    return ix * bins[1] + iy
+
+
+def accumulate(x, y, bins, out=None):
+    """
+    Adds the number of cells in each bin at each output time to out
+
+    All the positions are binned in a single call to np.bincount, by
+    combining the bin and the output time into one integer index
+
+    Parameters
+    ----------
+
+    x, y: ndarray
+        positions of the cells, of any shape with the output times along the
+        last axis, e.g. (replicates, cells, times)
+
+    bins: tuple of int
+        number of bins in each direction
+
+    out: ndarray
+        int64 accumulator of shape bins + (number of times,), created filled
+        with zeros if not given
+
+    Returns
+    -------
+
+    out
+
+    """
+    x = np.asarray(x)
+    nout = x.shape[-1]
+    if out is None:
+        out = np.zeros(tuple(bins) + (nout,), dtype=np.int64)
+
+    index = bin_index(x, y, bins) * nout + np.arange(nout)
+    size = bins[0] * bins[1] * nout
+    out += np.bincount(index.ravel(), minlength=size).reshape(out.shape)
+    return out
+
+
+def coarsen(counts, bins):
+    """
+    Sums the counts of a fine grid into the coarser grid bins, each of whose
+    sizes must divide the fine grid's
+    """
+    fine = counts.shape[:2]
+    if fine[0] % bins[0] or fine[1] % bins[1]:
+        raise ValueError('{} bins do not divide {} bins'.format(bins, fine))
+    shape = (bins[0], fine[0] // bins[0], bins[1], fine[1] // bins[1])
+    return counts.reshape(shape + counts.shape[2:]).sum(axis=(1, 3))
+
+
+def multi_resolution(x, y, resolutions, out=None):
+    """
+    Bins the positions at several resolutions in a single pass over the data
+
+    The positions are binned once on the finest grid that every resolution
+    divides (their least common multiple in each direction), and each
+    resolution is then summed from it
+
+    Parameters
+    ----------
+
+    x, y: ndarray
+        positions of the cells, as for accumulate
+
+    resolutions: list of tuple of int
+        number of bins in each direction of each resolution
+
+    out: ndarray
+        int64 accumulator on the finest grid, as for accumulate
+
+    Returns
+    -------
+
+    list of ndarray, the counts at each resolution
+
+    """
+    finest = (math.lcm(*[r[0] for r in resolutions]),
+              math.lcm(*[r[1] for r in resolutions]))
+    counts = accumulate(x, y, finest, out)
+    return [coarsen(counts, r) for r in resolutions]
@@ -0,0 +1,313 @@
+import multiprocessing as mp
+from multiprocessing import Pool, shared_memory
+import numpy as np
+import cell_model_cpp
+
+from .density import accumulate
+
+# set in each worker process by _init_worker
+_next_seed = None
+_stop = None
+_locks = None
+
+
+def _init_worker(next_seed, stop, locks):
+    global _next_seed, _stop, _locks
+    _next_seed = next_seed
+    _stop = stop
+    _locks = locks
+
+
+def _take_seed(n_samples):
+    """
+    Returns the next seed that no worker has run yet, or None once n_samples
+    seeds have been taken or the ensemble has been stopped
+    """
+    with _next_seed.get_lock():
+        seed = _next_seed.value
+        if seed >= n_samples or _stop.value:
+            return None
+        _next_seed.value += 1
+    return seed
+
+
+def _views(shm, n_processes, shape):
+    """
+    Returns views of the shared statistics block shm, holding the number of
+    samples, the mean histogram and the sum of squared differences from the
+    mean (M2) of each worker
+    """
+    counts = np.ndarray((n_processes,), dtype=np.int64, buffer=shm.buf)
+    moments = np.ndarray((n_processes, 2) + shape, dtype=np.float64,
+                         buffer=shm.buf, offset=8 * n_processes)
+    return counts, moments[:, 0], moments[:, 1]
+
+
+def merge_statistics(counts, means, m2s):
+    """
+    Combines the number of samples, mean and M2 of several sets of samples
+    into those of all the samples, using the pairwise update of Chan et al.
+    """
+    n = 0
+    mean = np.zeros_like(means[0])
+    m2 = np.zeros_like(m2s[0])
+    for n_b, mean_b, m2_b in zip(counts, means, m2s):
+        if n_b == 0:
+            continue
+        delta = mean_b - mean
+        total = n + n_b
+        mean = mean + delta * (n_b / total)
+        m2 = m2 + m2_b + delta**2 * (n * n_b / total)
+        n = total
+    return n, mean, m2
+
+
+def standard_error(n, m2):
+    """
+    Returns the standard error of the mean of each bin, from the number of
+    samples n and M2
+    """
+    if n < 2:
+        return np.full_like(m2, np.inf)
+    return np.sqrt(m2 / (n - 1) / n)
+
+
+def model(task):
+    """
+    Runs samples until there are none left, updating this worker's running
+    mean and M2 of the histogram of the cell positions at each output time
+    (Welford's algorithm) in slice index of the shared statistics
+
+    Parameters
+    ----------
+
+    task: tuple
+        (index, n_processes, name, parameters), where name is the shared
+        statistics block and parameters is a dict of the arguments to
+        run_ensemble
+
+    """
+    (index, n_processes, name, parameters) = task
+
+    n = parameters['n']
+    mu, sigma = parameters['mu'], parameters['sigma']
+    size = parameters['size']
+    max_dt = (parameters['timestep_ratio'] * size)**2 / 4.0
+    nout = parameters['nout']
+    bins = parameters['bins']
+    integrate_time = parameters['end_time'] / nout
+
+    shm = shared_memory.SharedMemory(name=name)
+    counts, means, m2s = _views(shm, n_processes, bins + (nout,))
+
+    # the statistics are updated locally, and copied to the shared memory
+    # under this worker's lock so that the main process reads them whole
+    count = 0
+    mean = np.zeros(bins + (nout,))
+    m2 = np.zeros(bins + (nout,))
+    hist = np.empty(bins + (nout,), dtype=np.int64)
+    sample = np.empty(bins + (nout,))
+    delta = np.empty(bins + (nout,))
+
+    xs = np.empty((n, nout))
+    ys = np.empty((n, nout))
+    sim = None
+
+    def run(seed, antithetic):
+        """
+        Runs one simulation and adds the histogram of all its output times to
+        hist
+        """
+        nonlocal sim
+
+        # the simulation is only created once, and reset for each sample
+        np.random.seed(seed)
+        x = np.random.normal(mu, sigma, n)
+        y = np.random.normal(mu, sigma, n)
+        if antithetic:
+            x = 2 * mu - x
+            y = 2 * mu - y
+        if sim is None:
+            sim = cell_model_cpp.Simulation(cell_model_cpp.VectorDouble(x),
+                                            cell_model_cpp.VectorDouble(y),
+                                            size, max_dt, seed)
+        else:
+            sim.reset(x, y, seed)
+        sim.set_antithetic(antithetic)
+
+        for i in range(nout):
+            # increment simulation
+            sim.integrate(integrate_time)
+
+            # extract cell positions
+            for j, p in enumerate(sim.get_positions()):
+                xs[j, i] = p.x
+                ys[j, i] = p.y
+
+        accumulate(xs, ys, bins, out=hist)
+
+    # with antithetic sampling each sample is the mean of a pair of simulations
+    # with the same seed, one of them antithetic
+    antithetic = parameters['sampling'] == 'antithetic'
+    runs_per_sample = 2 if antithetic else 1
+    while True:
+        k = _take_seed(parameters['n_samples'] // runs_per_sample)
+        if k is None:
+            break
+        seed = parameters['seed'] + k
+
+        hist[...] = 0
+        run(seed, False)
+        if antithetic:
+            run(seed, True)
+        np.divide(hist, runs_per_sample, out=sample)
+
+        count += 1
+        np.subtract(sample, mean, out=delta)
+        mean += delta / count
+        m2 += delta * (sample - mean)
+
+        with _locks[index]:
+            counts[index] = count
+            means[index] = mean
+            m2s[index] = m2
+
+    del counts, means, m2s
+    shm.close()
+    print('worker {} finished {} samples'.format(index, count))
+
+
+def run_ensemble(n_samples=100, n_processes=5, n=100, mu=0.5, sigma=0.05,
+                 size=0.02, timestep_ratio=0.23, end_time=0.01, nout=10,
+                 bins=(20, 20), target_error=None, error_norm='max',
+                 min_samples=10, poll_interval=0.1, return_statistics=False,
+                 sampling='independent', seed=0):
+    """
+    Runs an ensemble of simulations of the pybind11 Simulation class in parallel,
+    and returns the mean histogram of the cell positions at each output time
+
+    The workers take seeds from a shared counter and keep running statistics of
+    the histograms in shared memory. If target_error is given, the main process
+    merges these every poll_interval seconds and stops the workers as soon as
+    the standard error of the mean histogram is within target_error
+
+    Parameters
+    ----------
+
+    n_samples: int
+        maximum number of simulations, with seeds seed, seed+1, ...
+
+    n_processes: int
+        number of worker processes
+
+    n: int
+        number of cells
+
+    mu, sigma: float
+        mean and standard deviation of the initial positions of the cells
+
+    size: float
+        size of cells
+
+    timestep_ratio: float
+        maximum timestep allowed as fraction of the average diffusion step
+
+    end_time: float
+        end time for the simulation
+
+    nout: int
+        number of output steps
+
+    bins: tuple of int
+        number of histogram bins in each direction, over the unit square
+
+    target_error: float
+        target standard error of the mean number of cells in a bin, None runs
+        all n_samples samples
+
+    error_norm: str
+        'max' requires every bin to reach target_error, 'total' requires the
+        root sum of squares of the standard errors of all the bins to
+
+    min_samples: int
+        number of samples always run before stopping early
+
+    poll_interval: float
+        seconds between convergence checks
+
+    return_statistics: bool
+        also return the standard error of each bin and the number of samples
+
+    sampling: str
+        'independent' runs a simulation for each seed. 'antithetic' runs a pair
+        for each seed, the second with mirrored initial positions and negated
+        noise, and uses the mean of the pair as one sample
+
+    seed: int
+        seed of the first sample. Ensembles with the same seed use common
+        random numbers, which reduces the variance of differences between them
+
+    Returns
+    -------
+
+    np.ndarray of shape bins + (nout,), or if return_statistics is True a tuple
+    of it, the standard error of each bin and the number of samples run
+
+    """
+    if error_norm not in ('max', 'total'):
+        raise ValueError('unknown error_norm {}'.format(error_norm))
+    if sampling not in ('independent', 'antithetic'):
+        raise ValueError('unknown sampling {}'.format(sampling))
+
+    bins = tuple(bins)
+    parameters = dict(n_samples=n_samples, n=n, mu=mu, sigma=sigma, size=size,
+                      timestep_ratio=timestep_ratio, end_time=end_time,
+                      nout=nout, bins=bins, sampling=sampling, seed=seed)
+
+    shape = bins + (nout,)
+    shm = shared_memory.SharedMemory(
+        create=True, size=8 * n_processes * (1 + 2 * int(np.prod(shape))))
+    next_seed = mp.Value('q', 0)
+    stop = mp.Value('b', 0)
+    locks = [mp.Lock() for i in range(n_processes)]
+
+    def statistics():
+        for lock in locks:
+            lock.acquire()
+        try:
+            return merge_statistics(counts, means, m2s)
+        finally:
+            for lock in locks:
+                lock.release()
+
+    try:
+        counts, means, m2s = _views(shm, n_processes, shape)
+        counts[:] = 0
+        tasks = [(i, n_processes, shm.name, parameters)
+                 for i in range(n_processes)]
+        with Pool(n_processes, initializer=_init_worker,
+                  initargs=(next_seed, stop, locks)) as p:
+            result = p.map_async(model, tasks)
+            while target_error is not None and not result.ready():
+                result.wait(poll_interval)
+                count, _, m2 = statistics()
+                if count < min_samples:
+                    continue
+                error = standard_error(count, m2)
+                if error_norm == 'max':
+                    error = np.max(error)
+                else:
+                    error = np.sqrt(np.sum(error**2))
+                if error <= target_error:
+                    stop.value = 1
+            result.get()
+
+        count, mean, m2 = statistics()
+        del counts, means, m2s
+    finally:
+        shm.close()
+        shm.unlink()
+
+    if return_statistics:
+        return mean, standard_error(count, m2), count
+    return mean
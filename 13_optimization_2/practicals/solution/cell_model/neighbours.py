@@ -0,0 +1,130 @@
+import numpy as np
+
+
+def find_pairs(x, y, cutoff, periodic=False, box=(1.0, 1.0)):
+    """
+    Finds all ordered pairs of cells (i, j), i != j, that are closer than cutoff,
+    using a uniform grid of buckets (a cell list) over the domain
+
+    Parameters
+    ----------
+
+    x: np.ndarray
+        array of x positions of the cells, in [0, box[0]]
+
+    y: np.ndarray
+        array of y positions of the cells. Must be same length as x
+
+    cutoff: float
+        cutoff distance. Each bucket is at least cutoff wide, so only the
+        neighbouring 3x3 buckets of each cell need to be searched
+
+    periodic: bool or (bool, bool)
+        if True, distances are measured using the nearest periodic image of each
+        cell, and buckets on opposite sides of the domain are neighbours. A
+        tuple gives this separately for the x and y directions
+
+    box: (float, float)
+        width and height of the domain, the default is the unit square
+
+    Returns
+    -------
+
+    (i, j): tuple of np.ndarray
+        index arrays, each pair is included in both directions
+
+    """
+    if np.isscalar(periodic):
+        periodic = (periodic, periodic)
+
+    n_side = [max(1, int(np.floor(length / cutoff))) for length in box]
+    index = [np.clip((p * (n / length)).astype(np.intp), 0, n - 1)
+             for p, n, length in zip((x, y), n_side, box)]
+    n_buckets = n_side[0] * n_side[1]
+    bucket = index[1] * n_side[0] + index[0]
+
+    # sort cells by bucket so that each bucket is a contiguous range of order
+    order = np.argsort(bucket, kind='stable')
+    counts = np.bincount(bucket, minlength=n_buckets)
+    start = np.zeros(n_buckets + 1, dtype=np.intp)
+    np.cumsum(counts, out=start[1:])
+
+    # with periodic buckets, offsets that wrap onto the same bucket are only
+    # searched once
+    offsets = []
+    for n, wrap in zip(n_side, periodic):
+        if wrap:
+            offsets.append(sorted(set(o % n for o in (-1, 0, 1))))
+        else:
+            offsets.append((-1, 0, 1))
+
+    pairs_i = []
+    pairs_j = []
+    for ox in offsets[0]:
+        for oy in offsets[1]:
+            jx = index[0] + ox
+            jy = index[1] + oy
+            if periodic[0]:
+                jx %= n_side[0]
+            if periodic[1]:
+                jy %= n_side[1]
+            valid = (jx >= 0) & (jx < n_side[0]) & (jy >= 0) & (jy < n_side[1])
+            i = np.nonzero(valid)[0]
+            other = jy[valid] * n_side[0] + jx[valid]
+            c = counts[other]
+
+            # expand each cell i into the range of cells in the other bucket
+            first = np.repeat(start[other] - (np.cumsum(c) - c), c)
+            i = np.repeat(i, c)
+            j = order[first + np.arange(len(i))]
+
+            dx = x[i] - x[j]
+            dy = y[i] - y[j]
+            if periodic[0]:
+                dx -= box[0] * np.round(dx / box[0])
+            if periodic[1]:
+                dy -= box[1] * np.round(dy / box[1])
+            keep = dx**2 + dy**2 < cutoff**2
+            keep &= i != j
+            pairs_i.append(i[keep])
+            pairs_j.append(j[keep])
+
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def morton_codes(x, y, bits=16):
+    """
+    Calculates the Morton (Z-order) code of each cell. Sorting cells by their
+    Morton code places cells that are close in space close together in memory
+
+    Parameters
+    ----------
+
+    x: np.ndarray
+        array of x positions of the cells, in [0, 1]
+
+    y: np.ndarray
+        array of y positions of the cells. Must be same length as x
+
+    bits: int
+        number of bits used to quantise each coordinate, at most 32
+
+    Returns
+    -------
+
+    np.ndarray of np.uint64 codes
+
+    """
+    scale = 2**bits - 1
+    codes = np.zeros(len(x), dtype=np.uint64)
+    for shift, p in ((0, x), (1, y)):
+        q = np.clip(p * scale, 0, scale).astype(np.uint64)
+
+        # spread the bits of q out so that there is a zero between each bit
+        q = (q | (q << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+        q = (q | (q << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+        q = (q | (q << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        q = (q | (q << np.uint64(2))) & np.uint64(0x3333333333333333)
+        q = (q | (q << np.uint64(1))) & np.uint64(0x5555555555555555)
+        codes |= q << np.uint64(shift)
+    return codes
@@ -0,0 +1,170 @@
+import abc
+import numpy as np
+
+from .neighbours import find_pairs
+
+
+class Observable(abc.ABC):
+    def __init__(self, every=1):
+        """
+        Base class of the quantities that a simulation updates while it is
+        integrated, passed to the simulation's integrate method
+
+        Subclasses may implement start(sim), called once with the initial
+        state, and must implement update(sim), called every `every` steps
+
+        Parameters
+        ----------
+
+        every: int
+            number of time steps between updates
+
+        """
+        self.every = every
+        self.sim = None
+
+    def attach(self, sim):
+        """
+        Calls start the first time the observable is used with sim
+        """
+        if self.sim is not sim:
+            self.sim = sim
+            self.start(sim)
+
+    def observe(self, sim):
+        """
+        Calls update if sim has taken a multiple of self.every steps
+        """
+        if sim.n_steps % self.every == 0:
+            self.update(sim)
+
+    def start(self, sim):
+        pass
+
+    @abc.abstractmethod
+    def update(self, sim):
+        pass
+
+
+class MeanSquaredDisplacement(Observable):
+    def __init__(self, every=1):
+        """
+        The mean squared displacement of the cells from their initial positions
+        over time
+
+        The cells are followed across the periodic boundaries by adding the
+        nearest periodic image of their displacement since the last update to
+        their unwrapped positions, so a cell must move less than half the
+        domain between updates
+        """
+        super().__init__(every)
+        self.times = []
+        self.values = []
+
+    def start(self, sim):
+        x, y = sim.get_positions()
+        self.x0 = x.copy()
+        self.y0 = y.copy()
+        self.x_unwrapped = x.copy()
+        self.y_unwrapped = y.copy()
+        self.x_last = x
+        self.y_last = y
+        self.start_time = sim.time
+
+    def update(self, sim):
+        x, y = sim.get_positions()
+        dx = x - self.x_last
+        dy = y - self.y_last
+        dx -= np.round(dx)
+        dy -= np.round(dy)
+        self.x_unwrapped += dx
+        self.y_unwrapped += dy
+        self.x_last = x
+        self.y_last = y
+
+        self.times.append(sim.time - self.start_time)
+        self.values.append(np.mean((self.x_unwrapped - self.x0)**2 +
+                                   (self.y_unwrapped - self.y0)**2))
+
+    def result(self):
+        """
+        Returns a dict of the 'time' since the start and the 'msd' at each
+        update
+        """
+        return {'time': np.array(self.times), 'msd': np.array(self.values)}
+
+
+class RadialDistribution(Observable):
+    def __init__(self, r_max, n_bins=50, every=1):
+        """
+        The pair correlation function g(r) of the cells, averaged over all
+        updates
+
+        Only pairs closer than r_max are found, using the simulation's Verlet
+        lists if r_max is within its cutoff, or else a cell list, so each update
+        is O(n) rather than O(n^2). Distances use the nearest periodic image
+
+        Parameters
+        ----------
+
+        r_max: float
+            largest distance, at most 0.5
+
+        n_bins: int
+            number of bins between 0 and r_max
+
+        every: int
+            number of time steps between updates
+
+        """
+        super().__init__(every)
+        self.r_max = r_max
+        self.n_bins = n_bins
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.n_updates = 0
+        self.n_cells = 0
+
+    def pairs(self, sim):
+        """
+        Returns index arrays of the pairs of cells that are within r_max,
+        along with the number of times each pair is included
+        """
+        # a valid Verlet list holds every pair within cutoff + skin when it is
+        # built, but once cells have moved it is only complete up to cutoff
+        skin = getattr(sim, 'verlet_skin', None)
+        if (skin is not None and self.r_max <= sim.cutoff and
+                sim.neighbour_list_is_valid()):
+            i, j = sim.pairs
+            return i, j, 1
+        i, j = find_pairs(sim.x, sim.y, self.r_max, periodic=True)
+        return i, j, 2
+
+    def update(self, sim):
+        i, j, multiplicity = self.pairs(sim)
+        dx = sim.x[j] - sim.x[i]
+        dy = sim.y[j] - sim.y[i]
+        dx -= np.round(dx)
+        dy -= np.round(dy)
+        r = np.sqrt(dx**2 + dy**2)
+
+        # each pair contributes once, in the histogram of unordered pairs
+        index = (r * (self.n_bins / self.r_max)).astype(np.intp)
+        index = index[index < self.n_bins]
+        counts = np.bincount(index, minlength=self.n_bins)
+        self.counts += counts // multiplicity
+        self.n_updates += 1
+        self.n_cells = len(sim.x)
+
+    def result(self):
+        """
+        Returns a dict of the bin centres 'r' and the values of 'g' in each bin
+        """
+        edges = np.linspace(0.0, self.r_max, self.n_bins + 1)
+        shell_area = np.pi * (edges[1:]**2 - edges[:-1]**2)
+
+        # expected number of pairs in each shell for uniformly distributed cells
+        # on the unit square
+        n = self.n_cells
+        expected = 0.5 * n * (n - 1) * shell_area * max(self.n_updates, 1)
+        return {'r': 0.5 * (edges[1:] + edges[:-1]),
+                'g': self.counts / expected}
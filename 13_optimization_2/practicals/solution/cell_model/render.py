@@ -0,0 +1,183 @@
+import shutil
+import struct
+import subprocess
+import zlib
+from multiprocessing import Pool
+import numpy as np
+
+# largest number of (cell, pixel) pairs tested at once when splatting discs
+_chunk_pixels = 2**22
+
+
+def disc_stencil(radius):
+    """
+    Returns the row and column offsets of the pixels in the bounding box of a
+    disc of the given radius in pixels, with one pixel of margin for a disc
+    centred anywhere within a pixel
+    """
+    r = int(np.ceil(radius)) + 1
+    offsets = np.arange(-r, r + 1)
+    rows, columns = np.meshgrid(offsets, offsets, indexing='ij')
+    return rows.ravel(), columns.ravel()
+
+
+def render_frame(x, y, size, resolution=512, colour=(31, 119, 180),
+                 background=(255, 255, 255), out=None):
+    """
+    Rasterises the cells as discs of radius size into an RGB image of the unit
+    square, with y increasing upwards
+
+    Every cell is tested against every pixel of its stencil in one vectorised
+    operation (in chunks of cells to bound memory), and the pixels whose centre
+    lies within the disc are set to colour
+
+    Parameters
+    ----------
+
+    x, y: ndarray
+        positions of the cells
+
+    size: float
+        radius of the cells
+
+    resolution: int
+        width and height of the image in pixels
+
+    colour, background: tuple of 3 ints
+        RGB colours of the cells and of the background
+
+    out: ndarray
+        optional uint8 array of shape (resolution, resolution, 3) to render into
+
+    Returns
+    -------
+
+    ndarray of shape (resolution, resolution, 3) and dtype uint8
+
+    """
+    if out is None:
+        out = np.empty((resolution, resolution, 3), dtype=np.uint8)
+    out[...] = background
+    mask = np.zeros(resolution * resolution, dtype=bool)
+
+    radius = size * resolution
+    d_row, d_column = disc_stencil(radius)
+
+    # position of the cell centres in pixels, with row 0 at the top
+    column = np.asarray(x) * resolution
+    row = (1.0 - np.asarray(y)) * resolution
+
+    chunk = max(1, _chunk_pixels // len(d_row))
+    for start in range(0, len(column), chunk):
+        c = column[start:start + chunk, np.newaxis]
+        r = row[start:start + chunk, np.newaxis]
+        pixel_c = np.floor(c).astype(np.int64) + d_column
+        pixel_r = np.floor(r).astype(np.int64) + d_row
+        inside = ((pixel_c + 0.5 - c)**2 + (pixel_r + 0.5 - r)**2
+                  <= radius**2)
+        inside &= (pixel_c >= 0) & (pixel_c < resolution)
+        inside &= (pixel_r >= 0) & (pixel_r < resolution)
+        mask[pixel_r[inside] * resolution + pixel_c[inside]] = True
+
+    out.reshape(-1, 3)[mask] = colour
+    return out
+
+
+def write_png(filename, image, compression=6):
+    """
+    Writes an RGB uint8 image of shape (height, width, 3) to a PNG file, using
+    only zlib
+    """
+    height, width, _ = image.shape
+
+    # each row of the image data starts with a filter type byte, 0 for none
+    data = np.empty((height, 1 + 3 * width), dtype=np.uint8)
+    data[:, 0] = 0
+    data[:, 1:] = image.reshape(height, 3 * width)
+
+    def chunk(kind, payload):
+        return (struct.pack('>I', len(payload)) + kind + payload +
+                struct.pack('>I', zlib.crc32(kind + payload)))
+
+    with open(filename, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2,
+                                           0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(data.tobytes(), compression)))
+        f.write(chunk(b'IEND', b''))
+
+
+def _render_png(job):
+    (x, y, size, resolution, filename) = job
+    write_png(filename, render_frame(x, y, size, resolution))
+    return filename
+
+
+def _render_raw(job):
+    (x, y, size, resolution) = job
+    return render_frame(x, y, size, resolution).tobytes()
+
+
+def render(x, y, size, output, resolution=512, fps=10, processes=None):
+    """
+    Renders every frame of a simulation in parallel worker processes
+
+    If output contains '{}' each frame i is written to output.format(i) as a
+    PNG image by the workers. Otherwise the frames are piped in order into
+    ffmpeg, which encodes them into the single video file output
+
+    Parameters
+    ----------
+
+    x, y: ndarray
+        positions of the cells, of shape (number of frames, number of cells)
+
+    size: float
+        radius of the cells
+
+    output: str
+        filename pattern of the images, or filename of the video
+
+    resolution: int
+        width and height of the frames in pixels
+
+    fps: int
+        frames per second of the video
+
+    processes: int
+        number of worker processes, defaults to the number of cpus
+
+    Returns
+    -------
+
+    list of the filenames written
+
+    """
+    n_frames = len(x)
+
+    if '{}' in output:
+        jobs = [(x[i], y[i], size, resolution, output.format(i))
+                for i in range(n_frames)]
+        with Pool(processes) as p:
+            return p.map(_render_png, jobs, chunksize=1)
+
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError('ffmpeg is needed to write {}, use a filename with '
+                           '{{}} to write PNG images instead'.format(output))
+    command = [ffmpeg, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+               '-s', '{0}x{0}'.format(resolution), '-r', str(fps), '-i', '-',
+               '-pix_fmt', 'yuv420p', output]
+    encoder = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    jobs = [(x[i], y[i], size, resolution) for i in range(n_frames)]
+    try:
+        with Pool(processes) as p:
+            for frame in p.imap(_render_raw, jobs, chunksize=1):
+                encoder.stdin.write(frame)
+    finally:
+        encoder.stdin.close()
+        if encoder.wait() != 0:
+            raise RuntimeError('ffmpeg failed to write {}'.format(output))
+    return [output]
@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def seed_sequence(seed=None):
+    """
+    Returns a np.random.SeedSequence for seed, which may be None (fresh entropy
+    from the operating system), an int or already a SeedSequence
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def make_generator(seed=None):
+    """
+    Returns a PCG64 np.random.Generator seeded from seed, as for seed_sequence.
+    A Generator is returned unchanged
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.Generator(np.random.PCG64(seed_sequence(seed)))
+
+
+def spawn(seed, n):
+    """
+    Returns n independent child SeedSequences of seed, e.g. one for each
+    simulation of an ensemble. The streams do not overlap. An int seed always
+    gives the same children, but a SeedSequence counts the children it has
+    spawned, so each call on it gives new ones
+    """
+    return seed_sequence(seed).spawn(n)
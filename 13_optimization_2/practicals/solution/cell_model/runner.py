@@ -0,0 +1,150 @@
+import numpy as np
+
+# parameters used by the driver scripts, any of which can be overridden in the
+# dict passed to run_simulation
+default_parameters = {
+    # 'numpy', 'cpp_functions', 'cpp' or 'mp'
+    'backend': 'cpp',
+    'n': 100,
+    'mu': 0.5,
+    'sigma': 0.05,
+    'size': 0.02,
+    'timestep_ratio': 0.23,
+    'end_time': 0.01,
+    'nout': 10,
+    # runs with the same seed use common random numbers, whatever their other
+    # parameters. An antithetic run (numpy and cpp backends only) mirrors the
+    # initial positions and negates the noise of the run with the same seed
+    'seed': 0,
+    'antithetic': False,
+    # the pybind11 Simulation class always calculates interactions
+    'interactions': True,
+    # the interactions are calculated every interaction_substeps steps, and
+    # their drift is reused in between (not supported by the mp backend)
+    'interaction_substeps': 1,
+}
+
+
+def complete_parameters(parameters):
+    """
+    Returns a copy of default_parameters updated with parameters, raising a
+    ValueError for unknown parameter names
+    """
+    unknown = set(parameters) - set(default_parameters)
+    if unknown:
+        raise ValueError('unknown parameters: {}'.format(sorted(unknown)))
+    complete = dict(default_parameters)
+    complete.update(parameters)
+    return complete
+
+
+def create_simulation(parameters):
+    """
+    Creates the simulation object for the backend given in parameters, with the
+    initial positions of the cells drawn from a normal distribution
+    """
+    p = complete_parameters(parameters)
+    n = p['n']
+    size = p['size']
+    max_dt = (p['timestep_ratio'] * size)**2 / 4.0
+
+    np.random.seed(p['seed'])
+    x = np.random.normal(p['mu'], p['sigma'], n)
+    y = np.random.normal(p['mu'], p['sigma'], n)
+
+    backend = p['backend']
+    if p['interaction_substeps'] != 1 and backend == 'mp':
+        raise ValueError('interaction_substeps is not supported by the mp '
+                         'backend')
+    if p['antithetic']:
+        if backend not in ('numpy', 'cpp'):
+            raise ValueError('antithetic runs are not supported by the {} '
+                             'backend'.format(backend))
+        x = 2 * p['mu'] - x
+        y = 2 * p['mu'] - y
+    if backend == 'numpy':
+        from .Simulation import Simulation
+        sim = Simulation(x, y, size, max_dt, p['seed'])
+        sim.calculate_interactions = p['interactions']
+        sim.interaction_substeps = p['interaction_substeps']
+        sim.antithetic = p['antithetic']
+    elif backend == 'cpp_functions':
+        from .Simulation_cpp import Simulation_cpp
+        sim = Simulation_cpp(x, y, size, max_dt, p['seed'])
+        sim.calculate_interactions = p['interactions']
+        sim.interaction_substeps = p['interaction_substeps']
+    elif backend == 'cpp':
+        import cell_model_cpp
+        sim = cell_model_cpp.Simulation(cell_model_cpp.VectorDouble(x),
+                                        cell_model_cpp.VectorDouble(y),
+                                        size, max_dt, p['seed'])
+        sim.set_antithetic(p['antithetic'])
+        sim.set_interaction_substeps(p['interaction_substeps'])
+    elif backend == 'mp':
+        from .Simulation_mp import Simulation_mp
+        sim = Simulation_mp(x, y, size, max_dt, seed=p['seed'])
+        sim.calculate_interactions = p['interactions']
+    else:
+        raise ValueError('unknown backend {}'.format(backend))
+    return sim
+
+
+def get_positions(sim):
+    """
+    Returns copies of the x and y positions of the cells of any of the
+    simulation objects, in their original order
+    """
+    if hasattr(sim, 'get_positions'):
+        positions = sim.get_positions()
+        if isinstance(positions, tuple):
+            return positions
+        x = np.array([p.x for p in positions])
+        y = np.array([p.y for p in positions])
+        return x, y
+    return sim.x.copy(), sim.y.copy()
+
+
+def run_simulation(parameters, callback=None):
+    """
+    Runs a simulation and returns the positions of the cells at each output time
+
+    Parameters
+    ----------
+
+    parameters: dict
+        any of the entries in default_parameters
+
+    callback: callable
+        called as callback(i, x, y) after output step i
+
+    Returns
+    -------
+
+    dict with entries 'time' of shape (nout,), and 'x' and 'y' of shape
+    (nout, n)
+
+    """
+    p = complete_parameters(parameters)
+    nout = p['nout']
+    integrate_time = p['end_time'] / nout
+
+    result = {
+        'time': integrate_time * np.arange(1, nout + 1),
+        'x': np.empty((nout, p['n'])),
+        'y': np.empty((nout, p['n'])),
+    }
+
+    sim = create_simulation(p)
+    try:
+        for i in range(nout):
+            sim.integrate(integrate_time)
+            x, y = get_positions(sim)
+            result['x'][i] = x
+            result['y'][i] = y
+            if callback is not None:
+                callback(i, x, y)
+    finally:
+        if hasattr(sim, 'close'):
+            sim.close()
+
+    return result
@@ -0,0 +1,362 @@
+"""
+A local job server that runs simulations in a pool of warm worker processes
+
+Clients connect over a Unix socket (or a localhost TCP port) and send one JSON
+object per line. A job is submitted with
+
+    {"type": "submit", "parameters": {...}, "snapshots": false, "job": key}
+
+where parameters are any of cell_model.runner.default_parameters, and the
+optional "job" is the key of the parameters in cell_model.store.ResultStore,
+echoed back if the request is rejected. The server replies with a stream of
+JSON lines, each with the key of the job in "job":
+
+    {"type": "queued", ...}
+    {"type": "progress", "step": i, "nout": nout, ...}
+    {"type": "snapshot", "step": i, "x": [...], "y": [...], ...}
+    {"type": "done", "path": ..., "cached": false, ...}
+    {"type": "error", "message": ..., ...}
+
+Snapshots are only sent if requested when the job is first submitted. Jobs with
+the same parameters are only run once, later submissions join the stream of the
+running job, or get "done" straight away if the result is already in the store.
+
+Run the server with
+
+    python -m cell_model.server --socket /tmp/cell_model.sock
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing as mp
+import threading
+
+from .runner import complete_parameters, run_simulation
+from .store import ResultStore
+
+_progress_queue = None
+
+
+def _init_worker(queue):
+    """
+    Initialises a worker process, loading all the backends up front so that
+    jobs do not pay for the imports
+    """
+    global _progress_queue
+    _progress_queue = queue
+
+    from . import Simulation, Simulation_mp  # noqa: F401
+    try:
+        from . import Simulation_cpp  # noqa: F401
+    except ImportError:
+        pass
+    try:
+        import cell_model_cpp  # noqa: F401
+    except ImportError:
+        pass
+
+
+def _ping():
+    pass
+
+
+def _run_job(key, parameters, snapshots):
+    """
+    Runs the job with the given key in a worker process, sending progress (and
+    optionally snapshot) messages back through the progress queue
+    """
+    nout = parameters['nout']
+
+    def callback(i, x, y):
+        _progress_queue.put({'type': 'progress', 'job': key, 'step': i + 1,
+                             'nout': nout})
+        if snapshots:
+            _progress_queue.put({'type': 'snapshot', 'job': key, 'step': i + 1,
+                                 'x': x.tolist(), 'y': y.tolist()})
+
+    try:
+        return run_simulation(parameters, callback)
+    finally:
+        # marks the end of the messages from this job
+        _progress_queue.put({'type': 'finished', 'job': key})
+
+
+class JobServer:
+    def __init__(self, store='results', max_workers=None):
+        """
+        Creates a job server, with a pool of max_workers worker processes
+
+        Parameters
+        ----------
+
+        store: str or ResultStore
+            the on-disk store that results are written to
+
+        max_workers: int
+            number of worker processes, defaults to the number of cpus
+
+        """
+        if isinstance(store, str):
+            store = ResultStore(store)
+        self.store = store
+        self.max_workers = max_workers or mp.cpu_count()
+
+        self.progress = mp.Queue()
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            self.max_workers, initializer=_init_worker,
+            initargs=(self.progress,))
+
+        # subscribers of each queued or running job, each one an asyncio.Queue,
+        # and events set once all the messages from each job's worker arrived
+        self.jobs = {}
+        self.finished = {}
+
+        self.server = None
+        self.loop = None
+        self.forwarder = None
+
+    async def start(self, path=None, host='127.0.0.1', port=None):
+        """
+        Starts listening on the Unix socket path, or on host:port if path is
+        None, and starts all the worker processes
+        """
+        self.loop = asyncio.get_running_loop()
+        self.forwarder = threading.Thread(target=self._forward_progress,
+                                          daemon=True)
+        self.forwarder.start()
+
+        # start every worker process now rather than on the first jobs
+        await asyncio.gather(*[self.loop.run_in_executor(self.pool, _ping)
+                               for _ in range(self.max_workers)])
+
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_client,
+                                                          path)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, host,
+                                                     port)
+        return self.server
+
+    async def serve_forever(self, path=None, host='127.0.0.1', port=None):
+        """
+        Starts the server and serves clients until cancelled
+        """
+        server = await self.start(path, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Stops the worker processes and the progress forwarding thread
+        """
+        if self.server is not None:
+            self.server.close()
+        self.pool.shutdown(cancel_futures=True)
+        self.progress.put(None)
+        if self.forwarder is not None:
+            self.forwarder.join()
+
+    def _forward_progress(self):
+        """
+        Runs in a thread, passing messages from the workers to the event loop
+        """
+        while True:
+            message = self.progress.get()
+            if message is None:
+                break
+            self.loop.call_soon_threadsafe(self._publish, message)
+
+    def _publish(self, message):
+        if message['type'] == 'finished':
+            # the job may already be gone if its worker died part way through
+            event = self.finished.get(message['job'])
+            if event is not None:
+                event.set()
+            return
+        for subscriber in self.jobs.get(message['job'], []):
+            subscriber.put_nowait(message)
+
+    def submit(self, parameters, snapshots=False):
+        """
+        Submits a job, returning its key and an asyncio.Queue that receives all
+        the messages for the job, ending with a "done" or "error" message
+        """
+        parameters = complete_parameters(parameters)
+        key = self.store.key(parameters)
+        subscriber = asyncio.Queue()
+        subscriber.put_nowait({'type': 'queued', 'job': key})
+
+        if key in self.jobs:
+            self.jobs[key].append(subscriber)
+        elif key in self.store:
+            subscriber.put_nowait({'type': 'done', 'job': key,
+                                   'path': self.store.path(key),
+                                   'cached': True})
+        else:
+            self.jobs[key] = [subscriber]
+            self.finished[key] = asyncio.Event()
+            asyncio.ensure_future(self._run(key, parameters, snapshots))
+
+        return key, subscriber
+
+    async def _run(self, key, parameters, snapshots):
+        worker_finished = True
+        try:
+            result = await self.loop.run_in_executor(
+                self.pool, _run_job, key, parameters, snapshots)
+            await self.loop.run_in_executor(None, self.store.save, parameters,
+                                            result)
+            message = {'type': 'done', 'job': key,
+                       'path': self.store.path(key), 'cached': False}
+        except Exception as e:
+            message = {'type': 'error', 'job': key, 'message': repr(e)}
+            # a worker that died sends no 'finished' message, a failed job does
+            worker_finished = not isinstance(
+                e, concurrent.futures.BrokenExecutor)
+        if worker_finished:
+            # let the progress messages still in flight reach the subscribers,
+            # and keep a resubmitted job from taking this job's 'finished'
+            await self.finished[key].wait()
+
+        del self.finished[key]
+        for subscriber in self.jobs.pop(key):
+            subscriber.put_nowait(message)
+
+    async def handle_client(self, reader, writer):
+        """
+        Handles one client connection, which may submit any number of jobs
+        """
+        lock = asyncio.Lock()
+        streams = []
+
+        async def send(message):
+            async with lock:
+                writer.write(json.dumps(message).encode() + b'\n')
+                await writer.drain()
+
+        async def stream(subscriber):
+            while True:
+                message = await subscriber.get()
+                await send(message)
+                if message['type'] in ('done', 'error'):
+                    break
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # the client's key of the job, None until the request is read
+                job = None
+                try:
+                    request = json.loads(line)
+                    if (not isinstance(request, dict) or
+                            request.get('type') != 'submit'):
+                        raise ValueError('unknown request {}'.format(request))
+                    job = request.get('job')
+                    _, subscriber = self.submit(request.get('parameters', {}),
+                                                request.get('snapshots', False))
+                except ValueError as e:
+                    await send({'type': 'error', 'job': job,
+                                'message': repr(e)})
+                    continue
+                streams.append(asyncio.ensure_future(stream(subscriber)))
+            await asyncio.gather(*streams)
+        except ConnectionError:
+            for s in streams:
+                s.cancel()
+        finally:
+            writer.close()
+
+
+class Client:
+    def __init__(self, path=None, host='127.0.0.1', port=None):
+        """
+        An asyncio client for a JobServer listening on the Unix socket path, or
+        on host:port if path is None
+        """
+        self.path = path
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.receiver = None
+        self.jobs = {}
+
+    async def connect(self):
+        if self.path is not None:
+            self.reader, self.writer = await asyncio.open_unix_connection(
+                self.path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port)
+        self.receiver = asyncio.ensure_future(self._receive())
+        return self
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _receive(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            for queue in self.jobs.get(message['job'], []):
+                queue.put_nowait(message)
+
+    async def submit(self, parameters, snapshots=False):
+        """
+        Submits a job and asynchronously yields each message about it, ending
+        with a "done" or "error" message
+        """
+        key = ResultStore.key(complete_parameters(parameters))
+        queue = asyncio.Queue()
+
+        # a job that this client already submitted is not submitted again, its
+        # messages are sent to both callers
+        if key not in self.jobs:
+            self.jobs[key] = []
+            request = {'type': 'submit', 'parameters': parameters,
+                       'snapshots': snapshots, 'job': key}
+            self.writer.write(json.dumps(request).encode() + b'\n')
+            await self.writer.drain()
+        self.jobs[key].append(queue)
+        try:
+            while True:
+                message = await queue.get()
+                yield message
+                if message['type'] in ('done', 'error'):
+                    break
+        finally:
+            self.jobs[key].remove(queue)
+            if not self.jobs[key]:
+                del self.jobs[key]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='cell model job server')
+    parser.add_argument('--socket', help='path of the Unix socket to listen on')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='port to listen on if no socket is given')
+    parser.add_argument('--store', default='results',
+                        help='directory of the result store')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes')
+    args = parser.parse_args()
+
+    server = JobServer(args.store, args.workers)
+    asyncio.run(server.serve_forever(args.socket, args.host, args.port))
@@ -0,0 +1,96 @@
+import queue
+import threading
+import numpy as np
+
+
+class SnapshotWriter:
+    def __init__(self, write, n, buffers=2):
+        """
+        Hands snapshots of the cell positions to write(time, x, y) on a
+        background thread, so that compressing and writing them to disk overlaps
+        with the next integrate call of the simulation
+
+        Snapshots are copied into one of a fixed number of buffers, which are
+        reused once write has returned. When all the buffers are waiting to be
+        written, the next snapshot blocks until one is free, so a slow disk
+        slows the simulation down instead of filling the memory
+
+        Parameters
+        ----------
+
+        write: callable
+            called as write(time, x, y) on the background thread for each
+            snapshot, e.g. the write method of a TrajectoryWriter. x and y are
+            only valid until it returns
+
+        n: int
+            number of cells
+
+        buffers: int
+            number of snapshots that can be held, 2 for double buffering
+
+        """
+        self.write = write
+        self.x = np.empty((buffers, n))
+        self.y = np.empty((buffers, n))
+        self.times = np.empty(buffers)
+
+        # indices of the buffers that can be filled, and of those waiting to be
+        # written, None telling the thread to finish
+        self.free = queue.Queue()
+        for i in range(buffers):
+            self.free.put(i)
+        self.pending = queue.Queue(maxsize=buffers)
+        self.error = None
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            i = self.pending.get()
+            if i is None:
+                return
+            # after an error the remaining snapshots are dropped, but the
+            # buffers are still freed so that the simulation does not block
+            if self.error is None:
+                try:
+                    self.write(self.times[i], self.x[i], self.y[i])
+                except BaseException as e:
+                    self.error = e
+            self.free.put(i)
+
+    def _check(self):
+        """
+        Raises any exception from write in the calling thread. The error is
+        kept, so every later call and close raise it too
+        """
+        if self.error is not None:
+            raise RuntimeError('writing a snapshot failed') from self.error
+
+    def __call__(self, time, x, y):
+        """
+        Queues a copy of the positions x and y of the cells at time for writing,
+        blocking while all the buffers are in use
+        """
+        self._check()
+        i = self.free.get()
+        self.times[i] = time
+        self.x[i] = x
+        self.y[i] = y
+        self.pending.put(i)
+
+    def close(self):
+        """
+        Waits for all the queued snapshots to be written, and stops the thread
+        """
+        if self.thread.is_alive():
+            self.pending.put(None)
+            self.thread.join()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
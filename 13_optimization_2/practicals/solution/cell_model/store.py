@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+
+class ResultStore:
+    def __init__(self, directory='results'):
+        """
+        An on-disk store of simulation results, keyed by their parameters. Each
+        result is a .npz file of arrays, with its parameters in a .json file
+        alongside it
+
+        Parameters
+        ----------
+
+        directory: str
+            directory holding the results, created if it does not exist
+
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(parameters):
+        """
+        Returns a key that is the same for any dicts of equal parameters
+        """
+        text = json.dumps(parameters, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def path(self, key):
+        """
+        Returns the filename of the arrays stored under key
+        """
+        return os.path.join(self.directory, key + '.npz')
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def load(self, key):
+        """
+        Returns a dict of the arrays stored under key
+        """
+        with np.load(self.path(key)) as data:
+            return dict(data)
+
+    def load_parameters(self, key):
+        """
+        Returns the parameters of the result stored under key
+        """
+        with open(os.path.join(self.directory, key + '.json')) as f:
+            return json.load(f)
+
+    def save(self, parameters, result):
+        """
+        Stores the dict of arrays result under the key of parameters, and
+        returns the key
+
+        The files are written to a temporary name first, so that a result that
+        is in the store is always complete
+        """
+        key = self.key(parameters)
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(parameters, f, sort_keys=True, default=str)
+        os.replace(tmp, os.path.join(self.directory, key + '.json'))
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **result)
+        os.replace(tmp, self.path(key))
+
+        return key
@@ -0,0 +1,150 @@
+import csv
+import itertools
+import time
+from multiprocessing import Pool
+import numpy as np
+
+from .runner import complete_parameters, run_simulation
+from .store import ResultStore
+
+
+def expand_grid(grid):
+    """
+    Expands a dict of lists of parameter values into a list of parameter dicts,
+    one for every combination of values. Values that are not lists are used in
+    every combination
+    """
+    names = list(grid)
+    values = [v if isinstance(v, (list, tuple)) else [v] for v in grid.values()]
+    return [dict(zip(names, combination))
+            for combination in itertools.product(*values)]
+
+
+def estimate_cost(parameters):
+    """
+    Estimates the relative cost of running a simulation, as the number of time
+    steps times the number of pair interactions calculated per step
+
+    The NumPy and C++ function backends calculate all n^2 pairs, the other
+    backends only pairs in neighbouring buckets, about n * density * bucket area
+    """
+    p = complete_parameters(parameters)
+    n = p['n']
+    size = p['size']
+    max_dt = (p['timestep_ratio'] * size)**2 / 4.0
+    steps = np.ceil(p['end_time'] / max_dt)
+
+    if p['interactions'] or p['backend'] == 'cpp':
+        if p['backend'] in ('numpy', 'cpp_functions'):
+            pairs = n**2
+        else:
+            # 3x3 buckets, each at least 3 * size wide, clipped to the domain
+            pairs = n * min(n, max(1.0, n * 9 * (3 * size)**2))
+    else:
+        pairs = 0
+    return float(steps * (n + pairs))
+
+
+def _run_point(job):
+    """
+    Runs one point of a sweep in a worker process, saving the result to the
+    store so that only the row of the results table is sent back
+    """
+    (parameters, directory, cost) = job
+    start_time = time.perf_counter()
+    result = run_simulation(parameters)
+    wall_time = time.perf_counter() - start_time
+    key = ResultStore(directory).save(parameters, result)
+    return dict(parameters, key=key, cached=False, estimated_cost=cost,
+                wall_time=wall_time)
+
+
+def _sweep(points, store, processes):
+    """
+    Yields the cached rows of points, a list of (parameters, key, cost), then
+    runs the others in a process pool and yields their rows as they finish
+    """
+    jobs = []
+    for parameters, key, cost in points:
+        if key in store:
+            yield dict(parameters, key=key, cached=True, estimated_cost=cost,
+                       wall_time=0.0)
+        else:
+            jobs.append((parameters, store.directory, cost))
+
+    # longest processing time first
+    jobs.sort(key=lambda job: job[2], reverse=True)
+
+    if jobs:
+        with Pool(processes) as p:
+            for row in p.imap_unordered(_run_point, jobs, chunksize=1):
+                yield row
+
+
+def run_sweep(grid, store='results', processes=None):
+    """
+    Runs a simulation for every point of a parameter grid in parallel, and
+    returns an iterator over a row of results for each point, in the order the
+    points finish
+
+    Points already in the store are not run again, and points that appear more
+    than once in the grid are only run once. The other points are sent to the
+    process pool in order of decreasing estimated cost, so that the largest
+    jobs do not end up running alone at the end of the sweep. The grid is
+    checked before anything is run, raising a ValueError for unknown
+    parameters or the 'mp' backend, as pool workers cannot start their own
+    processes
+
+    Parameters
+    ----------
+
+    grid: dict or list of dicts
+        a dict of lists of parameter values, as for expand_grid, or a list of
+        parameter dicts
+
+    store: str or ResultStore
+        the on-disk store of results
+
+    processes: int
+        number of worker processes, defaults to the number of cpus
+
+    Returns
+    -------
+
+    iterator of a dict for each point of its parameters, its key in the store,
+    whether it was cached, its estimated cost and the wall time taken to run it
+
+    """
+    if isinstance(store, str):
+        store = ResultStore(store)
+    if isinstance(grid, dict):
+        grid = expand_grid(grid)
+
+    points = []
+    keys = set()
+    for parameters in grid:
+        parameters = complete_parameters(parameters)
+        if parameters['backend'] == 'mp':
+            raise ValueError('the mp backend cannot be used in a sweep')
+        key = store.key(parameters)
+        if key not in keys:
+            keys.add(key)
+            points.append((parameters, key, estimate_cost(parameters)))
+    return _sweep(points, store, processes)
+
+
+def write_table(rows, f):
+    """
+    Writes each row to the file f as a line of CSV as soon as it is available,
+    and returns the list of rows
+    """
+    writer = None
+    written = []
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(f, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        f.flush()
+        written.append(row)
+    return written
@@ -0,0 +1,268 @@
+import os
+import struct
+import zlib
+import numpy as np
+
+# file layout: a header, then chunks of consecutive frames, then an index of
+# the chunk offsets. Each chunk starts with its number of frames and
+# compressed length, then the times of its frames and the compressed frames
+_magic = b'CMTRAJ1\0'
+_index_magic = b'CMTRIDX\0'
+_header = struct.Struct('<8sIQI')
+_chunk_header = struct.Struct('<IQ')
+_footer = struct.Struct('<Q8s')
+
+_dtypes = {16: np.uint16, 32: np.uint32}
+
+
+def quantise(x, bits, out=None):
+    """
+    Returns the positions x in the unit square as unsigned fixed point numbers
+    with bits (16 or 32) bits, wrapping values outside [0, 1) periodically
+    """
+    scale = float(2**bits)
+    q = np.rint(np.asarray(x) * scale).astype(np.int64)
+    q &= 2**bits - 1
+    if out is None:
+        return q.astype(_dtypes[bits])
+    out[...] = q
+    return out
+
+
+def dequantise(q, bits, out=None):
+    """
+    Returns the positions in the unit square of the fixed point numbers q
+    """
+    return np.multiply(q, 1.0 / 2**bits, out=out)
+
+
+def _encode(frames, level):
+    """
+    Compresses an array of quantised frames of shape (n_frames, 2, n). All but
+    the first frame are stored as differences from the previous frame, which
+    wrap around like the domain, and the bytes of each value are split into
+    separate planes so that the mostly zero high bytes compress well
+    """
+    deltas = frames.copy()
+    np.subtract(frames[1:], frames[:-1], out=deltas[1:])
+    planes = deltas.reshape(-1).view(np.uint8).reshape(-1, deltas.itemsize).T
+    return zlib.compress(np.ascontiguousarray(planes).tobytes(), level)
+
+
+def _decode(data, n_frames, n, dtype):
+    """
+    Inverts _encode, returning the quantised frames of shape (n_frames, 2, n)
+    """
+    itemsize = np.dtype(dtype).itemsize
+    planes = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+    deltas = np.ascontiguousarray(planes.reshape(itemsize, -1).T).view(dtype)
+    deltas = deltas.reshape(n_frames, 2, n)
+    # unsigned integer additions wrap, undoing the differences
+    return np.cumsum(deltas, axis=0, dtype=dtype)
+
+
+class TrajectoryWriter:
+    def __init__(self, filename, n, bits=16, chunk_frames=16, level=6):
+        """
+        Writes the positions of n cells at a sequence of times to a compressed
+        trajectory file. Positions are quantised to bits bit fixed point
+        numbers, giving a resolution of 2**-bits of the unit square, and frames
+        are compressed in chunks of chunk_frames frames that can be read
+        independently by TrajectoryReader
+
+        Parameters
+        ----------
+
+        filename: str
+            file to write to, replacing any existing file
+
+        n: int
+            number of cells
+
+        bits: int
+            16 or 32
+
+        chunk_frames: int
+            number of frames in each compressed chunk
+
+        level: int
+            zlib compression level from 0 to 9
+
+        """
+        if bits not in _dtypes:
+            raise ValueError('bits must be 16 or 32, not {}'.format(bits))
+        self.n = n
+        self.bits = bits
+        self.chunk_frames = chunk_frames
+        self.level = level
+
+        self.frames = np.empty((chunk_frames, 2, n), dtype=_dtypes[bits])
+        self.times = np.empty(chunk_frames)
+        self.n_buffered = 0
+        self.offsets = []
+
+        self.file = open(filename, 'wb')
+        self.file.write(_header.pack(_magic, bits, n, chunk_frames))
+
+    def write(self, time, x, y):
+        """
+        Adds the positions x and y of the cells at time to the trajectory
+        """
+        i = self.n_buffered
+        quantise(x, self.bits, out=self.frames[i, 0])
+        quantise(y, self.bits, out=self.frames[i, 1])
+        self.times[i] = time
+        self.n_buffered += 1
+        if self.n_buffered == self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """
+        Compresses and writes the buffered frames as a chunk, which may be
+        shorter than chunk_frames
+        """
+        n_frames = self.n_buffered
+        if n_frames == 0:
+            return
+        data = _encode(self.frames[:n_frames], self.level)
+        self.offsets.append(self.file.tell())
+        self.file.write(_chunk_header.pack(n_frames, len(data)))
+        self.file.write(self.times[:n_frames].tobytes())
+        self.file.write(data)
+        self.n_buffered = 0
+
+    def close(self):
+        """
+        Writes any buffered frames and the chunk index, and closes the file
+        """
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.write(np.array(self.offsets, dtype='<u8').tobytes())
+        self.file.write(_footer.pack(len(self.offsets), _index_magic))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryReader:
+    def __init__(self, filename):
+        """
+        Reads a trajectory file written by TrajectoryWriter. Chunks are read
+        and decompressed one at a time, either by index with read_chunk or in
+        order by iterating over the reader, so that the whole trajectory never
+        needs to be in memory
+
+        A file that was not closed has no chunk index, and its chunks are found
+        by scanning the file instead
+        """
+        self.file = open(filename, 'rb')
+        magic, self.bits, self.n, self.chunk_frames = _header.unpack(
+            self.file.read(_header.size))
+        if magic != _magic:
+            raise ValueError('{} is not a trajectory file'.format(filename))
+        self.dtype = _dtypes[self.bits]
+
+        self.offsets = self._read_index()
+        self.chunk_sizes = []
+        times = []
+        for offset in self.offsets:
+            self.file.seek(offset)
+            n_frames, _ = _chunk_header.unpack(
+                self.file.read(_chunk_header.size))
+            self.chunk_sizes.append(n_frames)
+            times.append(np.frombuffer(self.file.read(8 * n_frames)))
+        self.times = np.concatenate(times) if times else np.empty(0)
+        self.chunk_starts = np.cumsum([0] + self.chunk_sizes)
+
+    def _read_index(self):
+        """
+        Returns the offsets of the chunks, from the index at the end of the file
+        or by scanning the chunk headers
+        """
+        end = self.file.seek(0, os.SEEK_END)
+        if end >= _header.size + _footer.size:
+            self.file.seek(end - _footer.size)
+            n_chunks, magic = _footer.unpack(self.file.read(_footer.size))
+            if magic == _index_magic:
+                self.file.seek(end - _footer.size - 8 * n_chunks)
+                return np.frombuffer(self.file.read(8 * n_chunks),
+                                     dtype='<u8').tolist()
+
+        offsets = []
+        offset = _header.size
+        while offset + _chunk_header.size <= end:
+            self.file.seek(offset)
+            n_frames, length = _chunk_header.unpack(
+                self.file.read(_chunk_header.size))
+            chunk_end = offset + _chunk_header.size + 8 * n_frames + length
+            if n_frames == 0 or chunk_end > end:
+                break
+            offsets.append(offset)
+            offset = chunk_end
+        return offsets
+
+    @property
+    def n_frames(self):
+        return len(self.times)
+
+    @property
+    def n_chunks(self):
+        return len(self.offsets)
+
+    def read_chunk(self, i):
+        """
+        Returns the times of the frames of chunk i, of shape (n_frames,), and
+        the x and y positions of the cells, each of shape (n_frames, n)
+        """
+        self.file.seek(self.offsets[i])
+        n_frames, length = _chunk_header.unpack(
+            self.file.read(_chunk_header.size))
+        times = np.frombuffer(self.file.read(8 * n_frames))
+        frames = _decode(self.file.read(length), n_frames, self.n, self.dtype)
+        positions = dequantise(frames, self.bits)
+        return times, positions[:, 0], positions[:, 1]
+
+    def read(self, start=0, stop=None):
+        """
+        Returns the times and x and y positions of frames start to stop,
+        decompressing only the chunks that hold them
+        """
+        stop = self.n_frames if stop is None else min(stop, self.n_frames)
+        times = np.empty(max(stop - start, 0))
+        x = np.empty((len(times), self.n))
+        y = np.empty((len(times), self.n))
+        first = np.searchsorted(self.chunk_starts, start, side='right') - 1
+        for i in range(max(first, 0), self.n_chunks):
+            begin = self.chunk_starts[i]
+            if begin >= stop:
+                break
+            chunk_times, chunk_x, chunk_y = self.read_chunk(i)
+            lo = max(start - begin, 0)
+            hi = min(stop - begin, len(chunk_times))
+            times[begin + lo - start:begin + hi - start] = chunk_times[lo:hi]
+            x[begin + lo - start:begin + hi - start] = chunk_x[lo:hi]
+            y[begin + lo - start:begin + hi - start] = chunk_y[lo:hi]
+        return times, x, y
+
+    def __iter__(self):
+        """
+        Yields the time and x and y positions of each frame in order
+        """
+        for i in range(self.n_chunks):
+            times, x, y = self.read_chunk(i)
+            for j in range(len(times)):
+                yield times[j], x[j], y[j]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
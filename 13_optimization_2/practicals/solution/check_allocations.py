@@ -0,0 +1,42 @@
+import tracemalloc
+import numpy as np
+import cell_model
+
+
+def allocations_per_step(sim, steps):
+    """
+    Returns the growth in traced memory per step, and the largest amount of
+    extra memory in use at any point, over steps time steps of sim, in bytes
+    """
+    # let the simulation allocate its buffers first
+    sim.step(sim.max_dt)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    for i in range(steps):
+        sim.step(sim.max_dt)
+    end, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (end - start) / steps, (peak - start)
+
+
+if __name__ == "__main__":
+    n = 1000
+    size = 0.02
+    max_dt = (0.23 * size)**2 / 4.0
+
+    rng = np.random.default_rng(0)
+    x = rng.uniform(size=n)
+    y = rng.uniform(size=n)
+    sim = cell_model.Simulation(x, y, size, max_dt, 0)
+    sim.calculate_interactions = True
+
+    # more steps than in a block of noise, so that new noise is drawn as well
+    growth, peak = allocations_per_step(sim, 2 * sim.noise_steps)
+    print('memory growth per step {} bytes, peak extra memory {} bytes'.format(
+        growth, peak))
+
+    # an array temporary would use at least 8 * n bytes
+    assert growth == 0
+    assert peak < 8 * n
@@ -0,0 +1,53 @@
+import numpy as np
+from cell_model.neighbours import find_pairs
+from cell_model.Simulation_mp import _halo, _interactions, _strip
+
+
+def reference_interactions(x, y, size, cutoff, dt):
+    """
+    Returns the displacement in x and in y of every cell by its interactions,
+    from all the pairs within cutoff using the nearest periodic image
+    """
+    i, j = find_pairs(x, y, cutoff, periodic=True)
+    dx = x[i] - x[j]
+    dy = y[i] - y[j]
+    dx -= np.round(dx)
+    dy -= np.round(dy)
+    r = np.sqrt(dx**2 + dy**2)
+    f = np.zeros_like(r)
+    np.divide((dt/size) * np.exp(-r/size), r, out=f, where=r > 0.0)
+    n = len(x)
+    return (np.bincount(i, weights=f * dx, minlength=n),
+            np.bincount(i, weights=f * dy, minlength=n))
+
+
+if __name__ == "__main__":
+    n = 1000
+    rng = np.random.default_rng(0)
+    x = rng.uniform(size=n)
+    y = rng.uniform(size=n)
+    # cells right at the periodic edges
+    x[:4] = (0.005, 0.995, 0.5, 0.0)
+    y[:4] = (0.5, 0.5, 0.002, 0.999)
+
+    # the forces of the workers, without the diffusion noise, must match the
+    # serial calculation whether or not the domain is decomposed
+    for size in (0.02, 0.2):
+        cutoff = 3.0 * size
+        dt = (0.23 * size)**2 / 4.0
+        expected_x, expected_y = reference_interactions(x, y, size, cutoff, dt)
+        for n_processes in (1, 2, 3, 8):
+            strip = _strip(x, n_processes)
+            got_x = np.empty(n)
+            got_y = np.empty(n)
+            for rank in range(n_processes):
+                owned = np.nonzero(strip == rank)[0]
+                halo = _halo(x, np.nonzero(strip != rank)[0], rank,
+                             n_processes, cutoff)
+                got_x[owned], got_y[owned] = _interactions(
+                    x, y, owned, halo, rank, n_processes, size, cutoff, dt)
+            error = max(np.max(np.abs(got_x - expected_x)),
+                        np.max(np.abs(got_y - expected_y)))
+            print('size {} with {} processes: max error {:.2e}'.format(
+                size, n_processes, error))
+            assert error < 1e-12
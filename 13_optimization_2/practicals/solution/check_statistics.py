@@ -0,0 +1,35 @@
+import numpy as np
+import cell_model_cpp
+
+modes = cell_model_cpp.InteractionMode
+
+
+if __name__ == "__main__":
+    n = 500
+    rng = np.random.default_rng(0)
+    x = rng.uniform(size=n)
+    y = rng.uniform(size=n)
+
+    # the statistics must be available for every mode and cell size, including
+    # cells over a third of the domain, for which the hash has no buckets. The
+    # grid mode only takes cells up to a sixth of the domain
+    for size in (0.02, 0.2, 0.4):
+        for mode in (modes.hash, modes.verlet, modes.tree, modes.quadtree,
+                     modes.grid):
+            if mode == modes.grid and size > 1.0 / 6.0:
+                continue
+            max_dt = (0.23 * size)**2 / 4.0
+            sim = cell_model_cpp.Simulation(cell_model_cpp.VectorDouble(x),
+                                            cell_model_cpp.VectorDouble(y),
+                                            size, max_dt, 0)
+            if mode == modes.verlet:
+                sim.set_verlet_skin(0.5 * size)
+            sim.set_interaction_mode(mode)
+            sim.integrate(3 * max_dt)
+            statistics = sim.get_statistics()
+            occupancy = statistics['bucket_occupancy']
+            print('size {} {}: {} pairs, {} buckets'.format(
+                size, mode.name, statistics['pairs_evaluated'],
+                sum(occupancy)))
+            # every cell is in exactly one bucket
+            assert sum(k * count for k, count in enumerate(occupancy)) == n
@@ -82,10 +82,17 @@ setup(
     packages=find_packages(include=('cell_model')),
     ext_modules=[CMakeExtension('cell_model_cpp',sourcedir='.')],
     cmdclass=dict(build_ext=CMakeBuild),
+    # Command-line entry points
+    entry_points={
+        'console_scripts': [
+            'cell-model=cell_model.cli:main',
+        ],
+    },
     # List of dependencies
     install_requires=[
         'numpy',
         'matplotlib',
+        'tomli; python_version < "3.11"',
     ],
 )
 
@@ -1,9 +1,8 @@
-import matplotlib.pyplot as plt
-import matplotlib
 import numpy as np
 import time
 import cProfile
 import cell_model
+from cell_model.render import render_frame, write_png
 
 if __name__ == "__main__":
 
@@ -41,7 +40,7 @@ if __name__ == "__main__":
     # now run the main simulation loop and visualise the positions of the cells at each
     # output step
     time_for_simulation = 0.0
-    f = plt.figure()
+    image = None
     for i in range(nout):
         # increment simulation
         start_time = time.perf_counter()
@@ -50,12 +49,8 @@ if __name__ == "__main__":
         time_for_simulation += end_time - start_time
 
         # plot
-        f.clear()
-        circles = [plt.Circle((xi,yi), radius=size) for xi,yi in
-                zip(sim.x,sim.y)]
-        c = matplotlib.collections.PatchCollection(circles)
-        f.gca().add_collection(c)
-        f.savefig('cells_{}.png'.format(i))
+        image = render_frame(sim.x, sim.y, size, out=image)
+        write_png('cells_{}.png'.format(i), image)
 
     print('finished simulation, time taken (excluding plotting) was {}'.format(
         time_for_simulation))
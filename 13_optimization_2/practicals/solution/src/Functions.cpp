@@ -1,29 +1,30 @@
 #include "Functions.hpp"
+#include <algorithm>
 #include <random>
+#include <stdexcept>
 
 std::default_random_engine generator;
 
-void diffusion(py::array_t<double> xn_arg, py::array_t<double> yn_arg,
-               const double dt) {
+namespace {
 
-  auto xn = xn_arg.mutable_unchecked<1>();
-  auto yn = yn_arg.mutable_unchecked<1>();
+// The kernels of a time step, shared between the functions that Python calls
+// once per step and integrate. A and B are any array types indexed with []
 
+template <typename A>
+void diffusion_kernel(A &xn, A &yn, const size_t n, const double dt,
+                      std::default_random_engine &engine) {
   std::normal_distribution<double> normal;
 
   const double c = std::sqrt(2.0 * dt);
 
-  for (size_t i = 0; i < xn.size(); ++i) {
-    xn[i] += c * normal(generator);
-    yn[i] += c * normal(generator);
+  for (size_t i = 0; i < n; ++i) {
+    xn[i] += c * normal(engine);
+    yn[i] += c * normal(engine);
   }
 }
-void boundaries(py::array_t<double> xn_arg, py::array_t<double> yn_arg,
-                const double dt) {
 
-  auto xn = xn_arg.mutable_unchecked<1>();
-  auto yn = yn_arg.mutable_unchecked<1>();
-  for (size_t i = 0; i < xn.size(); ++i) {
+template <typename A> void boundaries_kernel(A &xn, A &yn, const size_t n) {
+  for (size_t i = 0; i < n; ++i) {
     if (xn[i] < 0.0) {
       xn[i] = 1.0 + xn[i];
     } else if (xn[i] > 1.0) {
@@ -36,15 +37,12 @@ void boundaries(py::array_t<double> xn_arg, py::array_t<double> yn_arg,
     }
   }
 }
-void interactions(py::array_t<double> xn_arg, py::array_t<double> yn_arg,
-                  py::array_t<double> x_arg, py::array_t<double> y_arg,
-                  const double dt, const double size) {
-  auto x = x_arg.unchecked<1>();
-  auto y = y_arg.unchecked<1>();
-  auto xn = xn_arg.mutable_unchecked<1>();
-  auto yn = yn_arg.mutable_unchecked<1>();
-  for (size_t i = 0; i < xn.size(); ++i) {
-    for (size_t j = 0; j < xn.size(); ++j) {
+
+template <typename A, typename B>
+void interactions_kernel(A &xn, A &yn, const B &x, const B &y, const size_t n,
+                         const double dt, const double size) {
+  for (size_t i = 0; i < n; ++i) {
+    for (size_t j = 0; j < n; ++j) {
       const double dx_x = x[i] - x[j];
       const double dx_y = y[i] - y[j];
       const double r = std::sqrt(std::pow(dx_x, 2) + std::pow(dx_y, 2));
@@ -56,3 +54,98 @@ void interactions(py::array_t<double> xn_arg, py::array_t<double> yn_arg,
     }
   }
 }
+
+} // namespace
+
+void diffusion(py::array_t<double> xn_arg, py::array_t<double> yn_arg,
+               const double dt) {
+
+  auto xn = xn_arg.mutable_unchecked<1>();
+  auto yn = yn_arg.mutable_unchecked<1>();
+  diffusion_kernel(xn, yn, xn.size(), dt, generator);
+}
+void boundaries(py::array_t<double> xn_arg, py::array_t<double> yn_arg,
+                const double dt) {
+
+  auto xn = xn_arg.mutable_unchecked<1>();
+  auto yn = yn_arg.mutable_unchecked<1>();
+  boundaries_kernel(xn, yn, xn.size());
+}
+void interactions(py::array_t<double> xn_arg, py::array_t<double> yn_arg,
+                  py::array_t<double> x_arg, py::array_t<double> y_arg,
+                  const double dt, const double size) {
+  auto x = x_arg.unchecked<1>();
+  auto y = y_arg.unchecked<1>();
+  auto xn = xn_arg.mutable_unchecked<1>();
+  auto yn = yn_arg.mutable_unchecked<1>();
+  interactions_kernel(xn, yn, x, y, xn.size(), dt, size);
+}
+void integrate(py::array_t<double, py::array::c_style> x_arg,
+               py::array_t<double, py::array::c_style> y_arg,
+               const double period, const double max_dt, const double size,
+               const unsigned int seed, const bool calculate_interactions,
+               const int interaction_substeps) {
+  if (x_arg.size() != y_arg.size()) {
+    throw std::invalid_argument("x and y have different lengths");
+  }
+  const size_t n = x_arg.size();
+  double *const x_out = x_arg.mutable_data();
+  double *const y_out = y_arg.mutable_data();
+  std::vector<double> xn(n), yn(n), drift_x(n), drift_y(n);
+
+  {
+    // the time loop only touches the buffers of x_arg and y_arg, which these
+    // arguments keep alive, and local vectors, so the GIL is released. Other
+    // Python threads must not use the arrays until integrate returns
+    py::gil_scoped_release release;
+
+    // x and y point at the current positions, alternating between the arrays
+    // and xn and yn, which are swapped in each step instead of copied
+    double *x = x_out;
+    double *y = y_out;
+    double *xn_ptr = xn.data();
+    double *yn_ptr = yn.data();
+
+    std::default_random_engine engine(seed);
+
+    // the interactions are calculated every interaction_substeps steps, and
+    // the drift they give is reused for the steps in between
+    int drift_age = interaction_substeps;
+    auto step = [&](const double dt) {
+      std::copy(x, x + n, xn_ptr);
+      std::copy(y, y + n, yn_ptr);
+      if (calculate_interactions && interaction_substeps <= 1) {
+        interactions_kernel(xn_ptr, yn_ptr, x, y, n, dt, size);
+      } else if (calculate_interactions && drift_age >= interaction_substeps) {
+        std::fill(drift_x.begin(), drift_x.end(), 0.0);
+        std::fill(drift_y.begin(), drift_y.end(), 0.0);
+        interactions_kernel(drift_x, drift_y, x, y, n, 1.0, size);
+        drift_age = 0;
+      }
+      if (calculate_interactions && interaction_substeps > 1) {
+        for (size_t i = 0; i < n; ++i) {
+          xn_ptr[i] += dt * drift_x[i];
+          yn_ptr[i] += dt * drift_y[i];
+        }
+        ++drift_age;
+      }
+      diffusion_kernel(xn_ptr, yn_ptr, n, dt, engine);
+      boundaries_kernel(xn_ptr, yn_ptr, n);
+      std::swap(x, xn_ptr);
+      std::swap(y, yn_ptr);
+    };
+
+    const int n_steps = std::floor(period / max_dt);
+    for (int i = 0; i < n_steps; ++i) {
+      step(max_dt);
+    }
+    const double final_dt = period - max_dt * n_steps;
+    if (final_dt > 0) {
+      step(final_dt);
+    }
+    if (x != x_out) {
+      std::copy(x, x + n, x_out);
+      std::copy(y, y + n, y_out);
+    }
+  }
+}
@@ -11,5 +11,14 @@ void interactions(py::array_t<double> xn, py::array_t<double> yn,
                   const py::array_t<double> x, const py::array_t<double> y,
                   const double dt, const double size);
 
+// runs the whole time loop of Simulation_cpp over period, updating x and y in
+// place. The interactions are calculated every interaction_substeps steps.
+// x and y must be contiguous float64 arrays of the same length
+void integrate(py::array_t<double, py::array::c_style> x,
+               py::array_t<double, py::array::c_style> y,
+               const double period, const double max_dt, const double size,
+               const unsigned int seed, const bool calculate_interactions,
+               const int interaction_substeps);
+
 
 #endif
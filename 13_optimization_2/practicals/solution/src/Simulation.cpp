@@ -1,8 +1,11 @@
 #include "Simulation.hpp"
 #include <algorithm>
 #include <cassert>
+#include <chrono>
 #include <cmath>
 #include <iostream>
+#include <numeric>
+#include <stdexcept>
 
 PointHash::PointHash(const double size) {
   m_cutoff = 3 * size;
@@ -46,18 +49,133 @@ int PointHash::operator()(const Point &p) const {
   return bucket;
 }
 
+Point periodic_difference(const Point &a, const Point &b) {
+  Point dx(a.x - b.x, a.y - b.y);
+  if (dx.x > 0.5) {
+    dx.x -= 1.0;
+  } else if (dx.x < -0.5) {
+    dx.x += 1.0;
+  }
+  if (dx.y > 0.5) {
+    dx.y -= 1.0;
+  } else if (dx.y < -0.5) {
+    dx.y += 1.0;
+  }
+  return dx;
+}
+
+uint32_t morton_code(const Point &p) {
+  auto spread_bits = [](const double x) {
+    uint32_t q = static_cast<uint32_t>(
+        std::min(std::max(x, 0.0), 1.0) * 0xFFFF);
+    q = (q | (q << 8)) & 0x00FF00FF;
+    q = (q | (q << 4)) & 0x0F0F0F0F;
+    q = (q | (q << 2)) & 0x33333333;
+    q = (q | (q << 1)) & 0x55555555;
+    return q;
+  };
+  return spread_bits(p.x) | (spread_bits(p.y) << 1);
+}
+
+void QuadTree::build(const std::vector<Point> &positions,
+                     const int leaf_size, const double min_width) {
+  const size_t n = positions.size();
+  m_leaf_size = std::max(leaf_size, 1);
+  m_min_width = min_width;
+  m_keys.resize(n);
+  for (size_t i = 0; i < n; ++i) {
+    m_keys[i] = std::make_pair(morton_code(positions[i]), i);
+  }
+  std::sort(m_keys.begin(), m_keys.end());
+  m_cells.resize(n);
+  for (size_t i = 0; i < n; ++i) {
+    m_cells[i] = m_keys[i].second;
+  }
+
+  m_nodes.resize(1);
+  m_nodes[0].begin = 0;
+  m_nodes[0].end = n;
+  build_node(positions, 0, 0, 0, 0, 0);
+}
+
+void QuadTree::build_node(const std::vector<Point> &positions,
+                          const int index, const int level, const int ix,
+                          const int iy, const uint32_t prefix) {
+  // morton_code quantises each coordinate to 16 bits, of which level are fixed
+  // by the position of the node
+  const double width = (1 << (16 - level)) / 65535.0;
+  const int begin = m_nodes[index].begin;
+  const int end = m_nodes[index].end;
+  m_nodes[index].x0 = ix * width;
+  m_nodes[index].y0 = iy * width;
+  m_nodes[index].width = width;
+  m_nodes[index].first_child = -1;
+
+  Point sum;
+  if (end - begin <= m_leaf_size || 0.5 * width < m_min_width ||
+      level == 16) {
+    for (int k = begin; k < end; ++k) {
+      sum.x += positions[m_cells[k]].x;
+      sum.y += positions[m_cells[k]].y;
+    }
+  } else {
+    // the children are the ranges of cells with each value of the next two
+    // bits of the Morton code, y in the higher bit
+    const int shift = 2 * (15 - level);
+    const int first_child = m_nodes.size();
+    m_nodes.resize(first_child + 4);
+    m_nodes[index].first_child = first_child;
+    int child_begin = begin;
+    for (uint32_t q = 0; q < 4; ++q) {
+      const uint32_t child_prefix = prefix | (q << shift);
+      const uint32_t next_prefix = child_prefix + (1u << shift);
+      const int child_end =
+          q == 3 ? end
+                 : std::lower_bound(m_keys.begin() + child_begin,
+                                    m_keys.begin() + end,
+                                    std::make_pair(next_prefix, 0)) -
+                       m_keys.begin();
+      m_nodes[first_child + q].begin = child_begin;
+      m_nodes[first_child + q].end = child_end;
+      build_node(positions, first_child + q, level + 1, 2 * ix + (q & 1),
+                 2 * iy + (q >> 1), child_prefix);
+      const int count = child_end - child_begin;
+      sum.x += count * m_nodes[first_child + q].centre_of_mass.x;
+      sum.y += count * m_nodes[first_child + q].centre_of_mass.y;
+      child_begin = child_end;
+    }
+  }
+  const int count = std::max(end - begin, 1);
+  m_nodes[index].centre_of_mass = Point(sum.x / count, sum.y / count);
+}
+
+double periodic_distance(const Point &p, const QuadTree::Node &node) {
+  const double half_width = 0.5 * node.width;
+  const Point dx = periodic_difference(
+      p, Point(node.x0 + half_width, node.y0 + half_width));
+  const double gap_x = std::max(std::abs(dx.x) - half_width, 0.0);
+  const double gap_y = std::max(std::abs(dx.y) - half_width, 0.0);
+  return std::sqrt(gap_x * gap_x + gap_y * gap_y);
+}
+
 Simulation::Simulation(const std::vector<double> &x,
                        const std::vector<double> &y, const double size,
                        const double max_dt, const size_t seed)
-    : m_generator(seed), m_size(size), m_max_dt(max_dt), m_hash(size),
-      m_positions(m_hash.total_number_of_buckets(), m_hash) {
+    : m_generator(seed), m_antithetic(false), m_size(size), m_max_dt(max_dt),
+      m_hash(size),
+      m_positions(m_hash.total_number_of_buckets(), m_hash),
+      m_mode(InteractionMode::hash), m_interaction_substeps(1),
+      m_drift_age(-1), m_cutoff(3 * size), m_skin(0.0),
+      m_grid_side(0), m_theta(0.5), m_leaf_size(16), m_min_width_ratio(0.25),
+      m_sort_frequency(0), m_steps_since_reset(0) {
 
-  for (int i = 0; i < x.size(); ++i) {
-    m_positions.insert(Point(x[i], y[i]));
+  // keep the cells in the order given, so that the permutation map from
+  // sorting refers to the original cell indices
+  m_next_positions.resize(x.size());
+  for (size_t i = 0; i < x.size(); ++i) {
+    m_next_positions[i] = Point(x[i], y[i]);
   }
-
-  m_next_positions.resize(m_positions.size());
-  std::copy(m_positions.begin(), m_positions.end(), m_next_positions.begin());
+  m_positions.insert(m_next_positions.begin(), m_next_positions.end());
 
   for (int i = -1; i <= 1; i++) {
     for (int j = -1; j <= 1; j++) {
@@ -66,6 +184,60 @@ Simulation::Simulation(const std::vector<double> &x,
   }
 }
 
+void Simulation::reset(const std::vector<double> &x,
+                       const std::vector<double> &y, const size_t seed) {
+  if (x.size() != y.size()) {
+    throw std::invalid_argument("x and y have different lengths");
+  }
+  reset(x.data(), y.data(), x.size(), seed);
+}
+
+void Simulation::reset(const double *x, const double *y, const size_t n,
+                       const size_t seed) {
+  m_generator.seed(seed);
+  m_normal.reset();
+
+  m_next_positions.resize(n);
+  for (size_t i = 0; i < n; ++i) {
+    m_next_positions[i] = Point(x[i], y[i]);
+  }
+
+  // clearing keeps the bucket array of the hash
+  m_positions.clear();
+  if (m_mode == InteractionMode::hash) {
+    m_positions.insert(m_next_positions.begin(), m_next_positions.end());
+  }
+
+  m_ids.clear();
+  m_neighbour_start.clear();
+  m_drift_age = -1;
+  m_steps_since_reset = 0;
+  m_statistics = Statistics();
+}
+
+void Simulation::set_size(const double size) {
+  if (m_mode == InteractionMode::grid && 3 * size > 0.5) {
+    throw std::invalid_argument(
+        "the grid interaction mode needs a cutoff of at most half the domain "
+        "(size <= 1/6)");
+  }
+  m_size = size;
+  m_cutoff = 3 * size;
+  m_neighbour_start.clear();
+  m_drift_age = -1;
+
+  PointHash hash(size);
+  if (hash.number_of_buckets_along_side() !=
+      m_hash.number_of_buckets_along_side()) {
+    m_hash = hash;
+    m_positions = std::unordered_set<Point, PointHash>(
+        m_hash.total_number_of_buckets(), m_hash);
+    if (m_mode == InteractionMode::hash) {
+      m_positions.insert(m_next_positions.begin(), m_next_positions.end());
+    }
+  }
+}
+
 void Simulation::boundaries(const double dt) {
   std::transform(m_next_positions.begin(), m_next_positions.end(),
                  m_next_positions.begin(), [](const Point &i) {
@@ -84,7 +256,7 @@ void Simulation::boundaries(const double dt) {
                  });
 }
 void Simulation::diffusion(const double dt) {
-  const double c = std::sqrt(2.0 * dt);
+  const double c = (m_antithetic ? -1.0 : 1.0) * std::sqrt(2.0 * dt);
   std::transform(m_next_positions.begin(), m_next_positions.end(),
                  m_next_positions.begin(), [&](const Point &i) {
                    return Point(i.x + c * m_normal(m_generator),
@@ -116,6 +288,10 @@ void Simulation::interactions(const double dt) {
                     const double dx_y = i.y - j.y;
                     const double r =
                         std::sqrt(std::pow(dx_x, 2) + std::pow(dx_y, 2));
+                    ++m_statistics.pairs_evaluated;
+                    if (r > 0.0 && r < m_cutoff) {
+                      ++m_statistics.pairs_within_cutoff;
+                    }
                     if (r > 0.0) {
                       const double tmp =
                           (dt / m_size) * std::exp(-r / m_size) / r;
@@ -128,14 +304,480 @@ void Simulation::interactions(const double dt) {
       });
 }
 
+void Simulation::set_verlet_skin(const double skin) {
+  m_skin = std::max(skin, 0.0);
+  m_neighbour_start.clear();
+  set_interaction_mode(m_skin > 0.0 ? InteractionMode::verlet
+                                    : InteractionMode::hash);
+}
+
+void Simulation::set_interaction_mode(const InteractionMode mode) {
+  // with a longer cutoff the grid would find more than one image of a cell
+  if (mode == InteractionMode::grid && m_cutoff > 0.5) {
+    throw std::invalid_argument(
+        "the grid interaction mode needs a cutoff of at most half the domain "
+        "(size <= 1/6)");
+  }
+  if (mode == InteractionMode::hash && m_mode != InteractionMode::hash) {
+    // the hash is only kept up to date while it is used
+    m_positions.clear();
+    m_positions.insert(m_next_positions.begin(), m_next_positions.end());
+  }
+  m_mode = mode;
+}
+
+bool Simulation::neighbour_list_is_valid() const {
+  if (m_neighbour_start.size() != m_next_positions.size() + 1) {
+    return false;
+  }
+  const double max_dr2 = std::pow(0.5 * m_skin, 2);
+  for (size_t i = 0; i < m_next_positions.size(); ++i) {
+    const Point dx =
+        periodic_difference(m_next_positions[i], m_positions_at_rebuild[i]);
+    if (dx.x * dx.x + dx.y * dx.y > max_dr2) {
+      return false;
+    }
+  }
+  return true;
+}
+
+void Simulation::build_neighbour_list() {
+  const auto start_time = std::chrono::steady_clock::now();
+  const size_t n = m_next_positions.size();
+  const double list_cutoff = m_cutoff + m_skin;
+  const int n_side =
+      std::max(1, static_cast<int>(std::floor(1.0 / list_cutoff)));
+  auto bucket_coordinate = [&](const double x) {
+    return std::min(std::max(static_cast<int>(x * n_side), 0), n_side - 1);
+  };
+
+  // counting sort of the cells into buckets at least list_cutoff wide
+  std::vector<int> bucket(n);
+  m_bucket_start.assign(n_side * n_side + 1, 0);
+  for (size_t i = 0; i < n; ++i) {
+    const Point &p = m_next_positions[i];
+    bucket[i] = bucket_coordinate(p.y) * n_side + bucket_coordinate(p.x);
+    ++m_bucket_start[bucket[i] + 1];
+  }
+  std::partial_sum(m_bucket_start.begin(), m_bucket_start.end(),
+                   m_bucket_start.begin());
+  m_bucket_cells.resize(n);
+  std::vector<int> next_in_bucket(m_bucket_start.begin(),
+                                  m_bucket_start.end() - 1);
+  for (size_t i = 0; i < n; ++i) {
+    m_bucket_cells[next_in_bucket[bucket[i]]++] = i;
+  }
+
+  // store the neighbours j > i of each cell i contiguously, cell i has
+  // neighbours m_neighbours[m_neighbour_start[i]] to
+  // m_neighbours[m_neighbour_start[i+1]]. Each pair is only stored once
+  m_neighbour_start.resize(n + 1);
+  m_neighbours.clear();
+  std::vector<int> other_buckets;
+  for (size_t i = 0; i < n; ++i) {
+    m_neighbour_start[i] = m_neighbours.size();
+    const Point &p = m_next_positions[i];
+    const int bx = bucket[i] % n_side;
+    const int by = bucket[i] / n_side;
+
+    // buckets wrap around the periodic domain, with fewer than three buckets
+    // along a side the same bucket is reached by more than one offset
+    other_buckets.clear();
+    for (const auto &offset : m_bucket_offsets) {
+      const int ox = (bx + offset.first + n_side) % n_side;
+      const int oy = (by + offset.second + n_side) % n_side;
+      other_buckets.push_back(oy * n_side + ox);
+    }
+    std::sort(other_buckets.begin(), other_buckets.end());
+    other_buckets.erase(std::unique(other_buckets.begin(), other_buckets.end()),
+                        other_buckets.end());
+
+    for (const int other_bucket : other_buckets) {
+      for (int k = m_bucket_start[other_bucket];
+           k < m_bucket_start[other_bucket + 1]; ++k) {
+        const int j = m_bucket_cells[k];
+        const Point dx = periodic_difference(p, m_next_positions[j]);
+        if (j > static_cast<int>(i) &&
+            dx.x * dx.x + dx.y * dx.y < list_cutoff * list_cutoff) {
+          m_neighbours.push_back(j);
+        }
+      }
+    }
+  }
+  m_neighbour_start[n] = m_neighbours.size();
+
+  m_positions_at_rebuild = m_next_positions;
+  ++m_statistics.rebuilds;
+  m_statistics.neighbour_list_time +=
+      std::chrono::duration<double>(std::chrono::steady_clock::now() -
+                                    start_time)
+          .count();
+}
+
+void Simulation::interactions_verlet(const double dt) {
+  if (!neighbour_list_is_valid()) {
+    build_neighbour_list();
+  }
+  // the interaction is symmetric, so each pair in the list updates both cells
+  m_current_positions = m_next_positions;
+  m_statistics.pairs_evaluated += m_neighbours.size();
+  for (size_t i = 0; i < m_current_positions.size(); ++i) {
+    const Point &pi = m_current_positions[i];
+    for (int k = m_neighbour_start[i]; k < m_neighbour_start[i + 1]; ++k) {
+      const int j = m_neighbours[k];
+      const Point dx = periodic_difference(pi, m_current_positions[j]);
+      const double r = std::sqrt(dx.x * dx.x + dx.y * dx.y);
+      if (r > 0.0 && r < m_cutoff) {
+        ++m_statistics.pairs_within_cutoff;
+        const double tmp = (dt / m_size) * std::exp(-r / m_size) / r;
+        m_next_positions[i].x += tmp * dx.x;
+        m_next_positions[i].y += tmp * dx.y;
+        m_next_positions[j].x -= tmp * dx.x;
+        m_next_positions[j].y -= tmp * dx.y;
+      }
+    }
+  }
+}
+
+void Simulation::interactions_tree(const double dt) {
+  const auto start_time = std::chrono::steady_clock::now();
+  m_tree.build(m_next_positions, 8);
+  m_statistics.tree_build_time +=
+      std::chrono::duration<double>(std::chrono::steady_clock::now() -
+                                    start_time)
+          .count();
+
+  // nodes at least half the domain wide are always opened, as their centre of
+  // mass may be nearer another periodic image of the cell
+  const double theta2 = m_theta * m_theta;
+  const double cutoff2 = m_cutoff * m_cutoff;
+  const std::vector<QuadTree::Node> &nodes = m_tree.nodes();
+  const std::vector<int> &cells = m_tree.cells();
+  m_current_positions = m_next_positions;
+  for (size_t i = 0; i < m_current_positions.size(); ++i) {
+    const Point &pi = m_current_positions[i];
+    Point sum;
+    m_tree_stack.assign(1, 0);
+    while (!m_tree_stack.empty()) {
+      const QuadTree::Node &node = nodes[m_tree_stack.back()];
+      m_tree_stack.pop_back();
+      if (node.begin == node.end || periodic_distance(pi, node) >= m_cutoff) {
+        continue;
+      }
+      if (node.first_child < 0) {
+        m_statistics.pairs_evaluated += node.end - node.begin;
+        for (int k = node.begin; k < node.end; ++k) {
+          const Point dx =
+              periodic_difference(pi, m_current_positions[cells[k]]);
+          const double r = std::sqrt(dx.x * dx.x + dx.y * dx.y);
+          if (r > 0.0 && r < m_cutoff) {
+            ++m_statistics.pairs_within_cutoff;
+            const double tmp = (dt / m_size) * std::exp(-r / m_size) / r;
+            sum.x += tmp * dx.x;
+            sum.y += tmp * dx.y;
+          }
+        }
+        continue;
+      }
+      // only nodes entirely within the cutoff are approximated, so that the
+      // cutoff is applied exactly
+      const double half_width = 0.5 * node.width;
+      const Point to_centre = periodic_difference(
+          pi, Point(node.x0 + half_width, node.y0 + half_width));
+      const double far_x = std::abs(to_centre.x) + half_width;
+      const double far_y = std::abs(to_centre.y) + half_width;
+      const Point dx = periodic_difference(pi, node.centre_of_mass);
+      const double r2 = dx.x * dx.x + dx.y * dx.y;
+      if (node.width < 0.5 && node.width * node.width < theta2 * r2 &&
+          far_x * far_x + far_y * far_y < cutoff2) {
+        ++m_statistics.pairs_evaluated;
+        const double r = std::sqrt(r2);
+        const double tmp = (node.end - node.begin) * (dt / m_size) *
+                           std::exp(-r / m_size) / r;
+        sum.x += tmp * dx.x;
+        sum.y += tmp * dx.y;
+        continue;
+      }
+      for (int c = 0; c < 4; ++c) {
+        m_tree_stack.push_back(node.first_child + c);
+      }
+    }
+    m_next_positions[i].x += sum.x;
+    m_next_positions[i].y += sum.y;
+  }
+}
+
+void Simulation::interactions_quadtree(const double dt) {
+  const auto start_time = std::chrono::steady_clock::now();
+  m_tree.build(m_next_positions, m_leaf_size, m_min_width_ratio * m_cutoff);
+  m_statistics.tree_build_time +=
+      std::chrono::duration<double>(std::chrono::steady_clock::now() -
+                                    start_time)
+          .count();
+
+  // the interaction is symmetric, so each cell only searches for the cells
+  // after it in Morton order and updates both. Whole nodes of cells before it
+  // are skipped
+  const std::vector<QuadTree::Node> &nodes = m_tree.nodes();
+  const std::vector<int> &cells = m_tree.cells();
+  m_current_positions = m_next_positions;
+  for (size_t rank = 0; rank < cells.size(); ++rank) {
+    const int i = cells[rank];
+    const Point &pi = m_current_positions[i];
+    m_tree_stack.assign(1, 0);
+    while (!m_tree_stack.empty()) {
+      const QuadTree::Node &node = nodes[m_tree_stack.back()];
+      m_tree_stack.pop_back();
+      if (node.end <= static_cast<int>(rank) + 1 ||
+          periodic_distance(pi, node) >= m_cutoff) {
+        continue;
+      }
+      if (node.first_child >= 0) {
+        for (int c = 0; c < 4; ++c) {
+          m_tree_stack.push_back(node.first_child + c);
+        }
+        continue;
+      }
+      const int begin = std::max(node.begin, static_cast<int>(rank) + 1);
+      m_statistics.pairs_evaluated += node.end - begin;
+      for (int k = begin; k < node.end; ++k) {
+        const int j = cells[k];
+        const Point dx = periodic_difference(pi, m_current_positions[j]);
+        const double r = std::sqrt(dx.x * dx.x + dx.y * dx.y);
+        if (r > 0.0 && r < m_cutoff) {
+          ++m_statistics.pairs_within_cutoff;
+          const double tmp = (dt / m_size) * std::exp(-r / m_size) / r;
+          m_next_positions[i].x += tmp * dx.x;
+          m_next_positions[i].y += tmp * dx.y;
+          m_next_positions[j].x -= tmp * dx.x;
+          m_next_positions[j].y -= tmp * dx.y;
+        }
+      }
+    }
+  }
+}
+
+void Simulation::build_grid() {
+  const auto start_time = std::chrono::steady_clock::now();
+  const size_t n = m_next_positions.size();
+  const int n_side = std::max(1, static_cast<int>(std::floor(1.0 / m_cutoff)));
+  const int padded_side = n_side + 2;
+  m_grid_side = padded_side;
+
+  // the padded columns (or rows) holding images of a cell in interior bucket
+  // b, and the shift of each image. A cell in an edge bucket also has an image
+  // in the ghost bucket beyond the opposite edge
+  auto images = [&](const int b, int *column, double *shift) {
+    int count = 0;
+    column[count] = b + 1;
+    shift[count++] = 0.0;
+    if (b == 0) {
+      column[count] = n_side + 1;
+      shift[count++] = 1.0;
+    }
+    if (b == n_side - 1) {
+      column[count] = 0;
+      shift[count++] = -1.0;
+    }
+    return count;
+  };
+  auto bucket_coordinate = [&](const double x) {
+    return std::min(std::max(static_cast<int>(x * n_side), 0), n_side - 1);
+  };
+
+  // counting sort of the cells and their images into the padded buckets
+  int columns[3], rows[3];
+  double shift_x[3], shift_y[3];
+  m_grid_bucket.resize(n);
+  m_grid_start.assign(padded_side * padded_side + 1, 0);
+  for (size_t i = 0; i < n; ++i) {
+    const Point &p = m_next_positions[i];
+    const int bx = bucket_coordinate(p.x);
+    const int by = bucket_coordinate(p.y);
+    m_grid_bucket[i] = by * padded_side + bx;
+    const int n_columns = images(bx, columns, shift_x);
+    const int n_rows = images(by, rows, shift_y);
+    for (int a = 0; a < n_rows; ++a) {
+      for (int b = 0; b < n_columns; ++b) {
+        ++m_grid_start[rows[a] * padded_side + columns[b] + 1];
+      }
+    }
+  }
+  std::partial_sum(m_grid_start.begin(), m_grid_start.end(),
+                   m_grid_start.begin());
+  m_grid_points.resize(m_grid_start.back());
+  std::vector<int> next_in_bucket(m_grid_start.begin(),
+                                  m_grid_start.end() - 1);
+  for (size_t i = 0; i < n; ++i) {
+    const Point &p = m_next_positions[i];
+    const int n_columns = images(bucket_coordinate(p.x), columns, shift_x);
+    const int n_rows = images(bucket_coordinate(p.y), rows, shift_y);
+    for (int a = 0; a < n_rows; ++a) {
+      for (int b = 0; b < n_columns; ++b) {
+        m_grid_points[next_in_bucket[rows[a] * padded_side + columns[b]]++] =
+            Point(p.x + shift_x[b], p.y + shift_y[a]);
+      }
+    }
+  }
+
+  m_statistics.hash_rebuild_time +=
+      std::chrono::duration<double>(std::chrono::steady_clock::now() -
+                                    start_time)
+          .count();
+}
+
+void Simulation::interactions_grid(const double dt) {
+  build_grid();
+
+  // the 3 x 3 buckets around interior bucket (bx, by) are padded buckets bx
+  // to bx + 2 of rows by to by + 2, and the three buckets of a row are
+  // contiguous. Nothing wraps, and the cutoff is no more than a bucket wide,
+  // so with a cutoff up to half the domain each neighbour is found once, at
+  // its nearest image
+  for (size_t i = 0; i < m_next_positions.size(); ++i) {
+    const Point pi = m_next_positions[i];
+    Point sum;
+    for (int row = 0; row < 3; ++row) {
+      const int first = m_grid_bucket[i] + row * m_grid_side;
+      const int end = m_grid_start[first + 3];
+      m_statistics.pairs_evaluated += end - m_grid_start[first];
+      for (int k = m_grid_start[first]; k < end; ++k) {
+        const double dx_x = pi.x - m_grid_points[k].x;
+        const double dx_y = pi.y - m_grid_points[k].y;
+        const double r = std::sqrt(dx_x * dx_x + dx_y * dx_y);
+        if (r > 0.0 && r < m_cutoff) {
+          ++m_statistics.pairs_within_cutoff;
+          const double tmp = (dt / m_size) * std::exp(-r / m_size) / r;
+          sum.x += tmp * dx_x;
+          sum.y += tmp * dx_y;
+        }
+      }
+    }
+    m_next_positions[i].x += sum.x;
+    m_next_positions[i].y += sum.y;
+  }
+}
+
+void Simulation::set_sort_frequency(const int sort_frequency) {
+  m_sort_frequency = std::max(sort_frequency, 0);
+}
+
+void Simulation::sort_cells() {
+  const size_t n = m_next_positions.size();
+  if (m_ids.empty()) {
+    m_ids.resize(n);
+    std::iota(m_ids.begin(), m_ids.end(), 0);
+  }
+
+  m_sort_keys.resize(n);
+  for (size_t i = 0; i < n; ++i) {
+    m_sort_keys[i] = std::make_pair(morton_code(m_next_positions[i]), i);
+  }
+  std::sort(m_sort_keys.begin(), m_sort_keys.end());
+
+  // m_current_positions is overwritten at the start of each step, so use it to
+  // hold the unsorted positions
+  m_current_positions = m_next_positions;
+  std::vector<int> old_ids(m_ids);
+  for (size_t i = 0; i < n; ++i) {
+    m_next_positions[i] = m_current_positions[m_sort_keys[i].second];
+    m_ids[i] = old_ids[m_sort_keys[i].second];
+  }
+
+  // the Verlet lists and the drift refer to the old order of the cells
+  m_neighbour_start.clear();
+  m_drift_age = -1;
+  ++m_statistics.sorts;
+}
+
+const std::vector<Point> &Simulation::get_positions() {
+  if (m_ids.empty()) {
+    return m_next_positions;
+  }
+  m_output_positions.resize(m_next_positions.size());
+  for (size_t i = 0; i < m_next_positions.size(); ++i) {
+    m_output_positions[m_ids[i]] = m_next_positions[i];
+  }
+  return m_output_positions;
+}
+
+std::vector<size_t> Simulation::bucket_occupancy_histogram() const {
+  // with a cutoff over a third of the domain the hash has no buckets, and
+  // every cell is counted in a single bucket covering the domain
+  const int n_side = std::max(m_hash.number_of_buckets_along_side(), 1);
+  auto bucket_coordinate = [&](const double x) {
+    return std::min(std::max(static_cast<int>(x * n_side), 0), n_side - 1);
+  };
+  std::vector<size_t> occupancy(n_side * n_side, 0);
+  for (const Point &p : m_next_positions) {
+    ++occupancy[bucket_coordinate(p.y) * n_side + bucket_coordinate(p.x)];
+  }
+  const size_t max_load =
+      *std::max_element(occupancy.begin(), occupancy.end());
+  std::vector<size_t> histogram(max_load + 1, 0);
+  for (const size_t load : occupancy) {
+    ++histogram[load];
+  }
+  return histogram;
+}
+
 void Simulation::step(const double dt) {
-  interactions(dt);
+  if (m_sort_frequency > 0 && m_steps_since_reset % m_sort_frequency == 0) {
+    sort_cells();
+  }
+  if (m_interaction_substeps == 1) {
+    calculate_interactions(dt);
+  } else if (m_drift_age < 0 || m_drift_age >= m_interaction_substeps) {
+    // the drift is the displacement by the interactions per unit time
+    m_drift = m_next_positions;
+    calculate_interactions(dt);
+    for (size_t i = 0; i < m_next_positions.size(); ++i) {
+      m_drift[i].x = (m_next_positions[i].x - m_drift[i].x) / dt;
+      m_drift[i].y = (m_next_positions[i].y - m_drift[i].y) / dt;
+    }
+    m_drift_age = 1;
+  } else {
+    for (size_t i = 0; i < m_next_positions.size(); ++i) {
+      m_next_positions[i].x += dt * m_drift[i].x;
+      m_next_positions[i].y += dt * m_drift[i].y;
+    }
+    ++m_drift_age;
+  }
   diffusion(dt);
   boundaries(dt);
 
-  m_positions.clear();
-  m_positions.insert(m_next_positions.begin(), m_next_positions.end());
+  if (m_mode == InteractionMode::hash) {
+    const auto start_time = std::chrono::steady_clock::now();
+    m_positions.clear();
+    m_positions.insert(m_next_positions.begin(), m_next_positions.end());
+    m_statistics.hash_rebuild_time +=
+        std::chrono::duration<double>(std::chrono::steady_clock::now() -
+                                      start_time)
+            .count();
+  }
+  ++m_steps_since_reset;
+  ++m_statistics.steps;
 }
+void Simulation::calculate_interactions(const double dt) {
+  switch (m_mode) {
+  case InteractionMode::hash:
+    interactions(dt);
+    break;
+  case InteractionMode::verlet:
+    interactions_verlet(dt);
+    break;
+  case InteractionMode::tree:
+    interactions_tree(dt);
+    break;
+  case InteractionMode::quadtree:
+    interactions_quadtree(dt);
+    break;
+  case InteractionMode::grid:
+    interactions_grid(dt);
+    break;
+  }
+}
+
 void Simulation::integrate(const double period) {
   const int n = static_cast<int>(std::floor(period / m_max_dt));
   for (int i = 0; i < n; ++i) {
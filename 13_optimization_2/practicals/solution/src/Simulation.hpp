@@ -1,6 +1,8 @@
 #ifndef CELL_MODEL_SIMULATION
 #define CELL_MODEL_SIMULATION
 
+#include <algorithm>
+#include <cstdint>
 #include <random>
 #include <unordered_set>
 #include <vector>
@@ -20,6 +22,12 @@ public:
   double y;
 };
 
+// a - b, using the nearest periodic image of b on the unit square
+Point periodic_difference(const Point &a, const Point &b);
+
+// position of p along a Morton (Z-order) curve through the unit square
+uint32_t morton_code(const Point &p);
+
 struct PointHash {
 public:
   using Coord = std::pair<int, int>;
@@ -38,30 +46,198 @@ private:
   double m_cutoff;
 };
 
+// a quadtree of cells on the unit square, built by sorting the cells along a
+// Morton curve so that the cells of each node are contiguous. A node is split
+// into four children while it holds more than leaf_size cells and its children
+// would be at least min_width wide, so dense regions are divided finely and
+// sparse regions are left coarse
+class QuadTree {
+public:
+  struct Node {
+    // lower corner and width of the square covered by the node
+    double x0;
+    double y0;
+    double width;
+    Point centre_of_mass;
+    // the node holds cells()[begin] to cells()[end - 1]
+    int begin;
+    int end;
+    // index of the first of the four children, which are stored contiguously,
+    // or -1 for a leaf
+    int first_child;
+  };
+
+  void build(const std::vector<Point> &positions, const int leaf_size,
+             const double min_width = 0.0);
+  const std::vector<Node> &nodes() const { return m_nodes; }
+  const std::vector<int> &cells() const { return m_cells; }
+
+private:
+  void build_node(const std::vector<Point> &positions, const int index,
+                  const int level, const int ix, const int iy,
+                  const uint32_t prefix);
+
+  int m_leaf_size;
+  double m_min_width;
+  std::vector<std::pair<uint32_t, int>> m_keys;
+  std::vector<int> m_cells;
+  std::vector<Node> m_nodes;
+};
+
+// distance from p to the nearest periodic image of the square of node
+double periodic_distance(const Point &p, const QuadTree::Node &node);
+
+// how Simulation calculates the interactions: by searching the hash buckets
+// every step, from Verlet neighbour lists, with a Barnes-Hut quadtree,
+// exactly by searching an adaptive quadtree for the neighbours within the
+// cutoff, or by searching a bucket grid padded with periodic images
+enum class InteractionMode { hash, verlet, tree, quadtree, grid };
+
+struct Statistics {
+  size_t steps = 0;
+  size_t rebuilds = 0;
+  size_t sorts = 0;
+
+  // number of distances calculated between cells, and how many of them were
+  // between distinct cells closer than the cutoff. Searching the hash visits
+  // each pair twice, the Verlet lists once
+  size_t pairs_evaluated = 0;
+  size_t pairs_within_cutoff = 0;
+
+  // seconds spent rebuilding the hash of positions (or the bucket grid) and
+  // the Verlet lists
+  double hash_rebuild_time = 0.0;
+  double neighbour_list_time = 0.0;
+  double tree_build_time = 0.0;
+};
+
 class Simulation {
 public:
   Simulation(const std::vector<double> &x, const std::vector<double> &y,
              const double size, const double max_dt, const size_t seed=0);
 
+  void integrate(const double period);
+  const std::vector<Point> &get_positions();
 
+  // restarts the simulation from new positions with a new seed, reusing the
+  // allocated storage. The Verlet skin and sort frequency are kept, the
+  // statistics are zeroed. Throws std::invalid_argument if x and y have
+  // different lengths
+  void reset(const std::vector<double> &x, const std::vector<double> &y,
+             const size_t seed);
+  void reset(const double *x, const double *y, const size_t n,
+             const size_t seed);
 
-  void integrate(const double period);
-  const std::vector<Point> &get_positions() { return m_next_positions; }
+  // the hash buckets are only reallocated if a new size changes their number
+  void set_size(const double size);
+  void set_max_dt(const double max_dt) { m_max_dt = max_dt; }
+
+  // the interactions are only calculated every substeps steps, and the drift
+  // they give is reused for the steps in between. 1 calculates them every step
+  void set_interaction_substeps(const int substeps) {
+    m_interaction_substeps = std::max(substeps, 1);
+  }
+
+  // an antithetic simulation uses the negated diffusion noise of the
+  // simulation with the same seed, so that the pair is negatively correlated
+  void set_antithetic(const bool antithetic) { m_antithetic = antithetic; }
+
+  // a skin > 0 switches the interactions to use Verlet neighbour lists, a skin
+  // <= 0 switches back to searching the hash buckets every step. The Verlet
+  // lists use the nearest periodic image of each neighbour
+  void set_verlet_skin(const double skin);
+
+  // throws std::invalid_argument for the grid mode with a cutoff over half the
+  // domain, as does set_size in the grid mode
+  void set_interaction_mode(const InteractionMode mode);
+  InteractionMode get_interaction_mode() const { return m_mode; }
+
+  // in the quadtree mode, leaves are only divided while they hold more than
+  // leaf_size cells and are wider than the cutoff times min_width_ratio
+  void set_quadtree_leaf(const int leaf_size, const double min_width_ratio) {
+    m_leaf_size = leaf_size;
+    m_min_width_ratio = min_width_ratio;
+  }
+
+  // in the tree mode, a node of the quadtree further than its width / theta
+  // from a cell interacts with it as a single cell of the combined weight at
+  // its centre of mass. Smaller theta is more accurate, 0 is exact. Nodes
+  // further than the cutoff are skipped, and distances use the nearest
+  // periodic image
+  void set_tree_theta(const double theta) { m_theta = theta; }
+  const Statistics &get_statistics() const { return m_statistics; }
+  void reset_statistics() { m_statistics = Statistics(); }
+
+  // element k is the number of hash buckets that currently hold k cells
+  std::vector<size_t> bucket_occupancy_histogram() const;
+
+  // every sort_frequency steps the cells are stored in Morton order, 0
+  // disables sorting. get_positions always returns the original order
+  void set_sort_frequency(const int sort_frequency);
 
 private:
   void boundaries(const double dt);
   void diffusion(const double dt);
+  void calculate_interactions(const double dt);
   void interactions(const double dt);
+  void interactions_verlet(const double dt);
+  void interactions_tree(const double dt);
+  void interactions_quadtree(const double dt);
+  void build_grid();
+  void interactions_grid(const double dt);
+  bool neighbour_list_is_valid() const;
+  void build_neighbour_list();
+  void sort_cells();
   void step(const double dt);
 
   std::default_random_engine m_generator;
   std::normal_distribution<double> m_normal;
+  bool m_antithetic;
   double m_size;
   double m_max_dt;
   PointHash m_hash;
   std::vector<std::pair<int, int>> m_bucket_offsets;
   std::unordered_set<Point, PointHash> m_positions;
   std::vector<Point> m_next_positions;
+
+  InteractionMode m_mode;
+  int m_interaction_substeps;
+  // steps since the drift was calculated, or -1 if it must be recalculated
+  int m_drift_age;
+  std::vector<Point> m_drift;
+  double m_cutoff;
+  double m_skin;
+  std::vector<Point> m_current_positions;
+  std::vector<Point> m_positions_at_rebuild;
+  std::vector<int> m_bucket_start;
+  std::vector<int> m_bucket_cells;
+  std::vector<int> m_neighbour_start;
+  std::vector<int> m_neighbours;
+
+  // the grid has a layer of ghost buckets around the unit square, holding
+  // copies of the cells in the buckets on the opposite edge shifted by the
+  // width of the domain. The buckets are stored row by row, with the cells of
+  // bucket b at m_grid_points[m_grid_start[b]] to
+  // m_grid_points[m_grid_start[b + 1] - 1]. A cutoff over half the domain
+  // (size > 1/6) would find more than one image of a cell, so it is rejected
+  int m_grid_side;
+  std::vector<int> m_grid_start;
+  std::vector<Point> m_grid_points;
+  std::vector<int> m_grid_bucket;
+
+  double m_theta;
+  int m_leaf_size;
+  double m_min_width_ratio;
+  QuadTree m_tree;
+  std::vector<int> m_tree_stack;
+
+  int m_sort_frequency;
+  size_t m_steps_since_reset;
+  std::vector<int> m_ids;
+  std::vector<std::pair<uint32_t, int>> m_sort_keys;
+  std::vector<Point> m_output_positions;
+
+  Statistics m_statistics;
 };
 
 #endif
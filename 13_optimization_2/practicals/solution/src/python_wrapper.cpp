@@ -16,6 +16,11 @@ PYBIND11_MODULE(cell_model_cpp, m) {
   m.def("diffusion", &diffusion, "Calculate diffusion");
   m.def("boundaries", &boundaries, "Calculate boundaries");
   m.def("interactions", &interactions, "Calculate interactions");
+  m.def("integrate", &integrate, "Integrate over a time period",
+        // no conversion, as x and y are updated in place
+        py::arg("x").noconvert(), py::arg("y").noconvert(), py::arg("period"),
+        py::arg("max_dt"), py::arg("size"), py::arg("seed"),
+        py::arg("interactions") = true, py::arg("interaction_substeps") = 1);
 
   py::class_<Point>(m, "Point")
       .def(py::init<>())
@@ -23,9 +28,63 @@ PYBIND11_MODULE(cell_model_cpp, m) {
       .def_readwrite("x", &Point::x)
       .def_readwrite("y", &Point::y);
 
+  py::enum_<InteractionMode>(m, "InteractionMode")
+      .value("hash", InteractionMode::hash)
+      .value("verlet", InteractionMode::verlet)
+      .value("tree", InteractionMode::tree)
+      .value("quadtree", InteractionMode::quadtree)
+      .value("grid", InteractionMode::grid);
+
   py::class_<Simulation>(m, "Simulation")
       .def(py::init<const std::vector<double> &, const std::vector<double> &,
                     const double, const double, const size_t>())
-      .def("integrate", &Simulation::integrate)
-      .def("get_positions", &Simulation::get_positions);
+      // integrate only uses the simulation's own state, so other Python threads
+      // (e.g. a cell_model.snapshots.SnapshotWriter) can run meanwhile
+      .def("integrate", &Simulation::integrate,
+           py::call_guard<py::gil_scoped_release>())
+      .def("get_positions", &Simulation::get_positions)
+      .def("reset",
+           py::overload_cast<const std::vector<double> &,
+                             const std::vector<double> &, const size_t>(
+               &Simulation::reset))
+      .def("reset",
+           [](Simulation &sim, py::array_t<double, py::array::c_style> x,
+              py::array_t<double, py::array::c_style> y, const size_t seed) {
+             if (x.size() != y.size()) {
+               throw std::invalid_argument("x and y have different lengths");
+             }
+             sim.reset(x.data(), y.data(), x.size(), seed);
+           })
+      .def("set_size", &Simulation::set_size)
+      .def("set_max_dt", &Simulation::set_max_dt)
+      .def("set_antithetic", &Simulation::set_antithetic)
+      .def("set_interaction_substeps", &Simulation::set_interaction_substeps)
+      .def("set_verlet_skin", &Simulation::set_verlet_skin)
+      .def("set_interaction_mode", &Simulation::set_interaction_mode)
+      .def("get_interaction_mode", &Simulation::get_interaction_mode)
+      .def("set_tree_theta", &Simulation::set_tree_theta)
+      .def("set_quadtree_leaf", &Simulation::set_quadtree_leaf)
+      .def("set_sort_frequency", &Simulation::set_sort_frequency)
+      .def("get_statistics", [](const Simulation &sim) {
+        const Statistics &stats = sim.get_statistics();
+        py::dict d;
+        d["steps"] = stats.steps;
+        d["rebuilds"] = stats.rebuilds;
+        d["rebuild_frequency"] = static_cast<double>(stats.rebuilds) /
+                                 std::max<size_t>(stats.steps, 1);
+        d["sorts"] = stats.sorts;
+        d["pairs_evaluated"] = stats.pairs_evaluated;
+        d["pairs_within_cutoff"] = stats.pairs_within_cutoff;
+        d["hash_rebuild_time"] = stats.hash_rebuild_time;
+        d["neighbour_list_time"] = stats.neighbour_list_time;
+        d["tree_build_time"] = stats.tree_build_time;
+
+        // the bucket occupancy is measured from the current positions
+        const std::vector<size_t> histogram = sim.bucket_occupancy_histogram();
+        d["bucket_occupancy"] =
+            py::array_t<size_t>(histogram.size(), histogram.data());
+        d["max_bucket_load"] = histogram.size() - 1;
+        return d;
+      })
+      .def("reset_statistics", &Simulation::reset_statistics);
 }